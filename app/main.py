@@ -3,10 +3,9 @@ import os
 import sys
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))  # Parent directory where is the fedstellar module
-import fedstellar
-from fedstellar.controller import Controller
+import fedstellar  # lightweight (only metadata), the controller is imported once the arguments are parsed
 
-argparser = argparse.ArgumentParser(description='Controller of Fedstellar framework', add_help=False)
+argparser = argparse.ArgumentParser(description='Controller of Fedstellar framework', add_help=False, allow_abbrev=False)
 
 argparser.add_argument('-cl', '--cloud', dest='cloud', action='store_true', default=False,
                        help='Run framework in cloud (default: False) (only for Linux)')
@@ -45,4 +44,7 @@ args = argparser.parse_args()
 Code for deploying the controller 
 '''
 if __name__ == '__main__':
+    # Imported here so --help, --version and --about don't pay the import of the controller dependencies
+    from fedstellar.controller import Controller
+
     Controller(args).start()
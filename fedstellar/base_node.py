@@ -14,22 +14,113 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
+import atexit
 import json
 import logging
 import os
+import queue
+import selectors
 import socket
+import subprocess
 import threading
 from datetime import datetime
 from logging import Formatter, FileHandler
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 
 from fedstellar.communication_protocol import CommunicationProtocol
-from fedstellar.encrypter import AESCipher, RSACipher
-from fedstellar.gossiper import Gossiper
-from fedstellar.heartbeater import Heartbeater
-from fedstellar.node_connection import NodeConnection
+from fedstellar.node_connection import ConnectionReactor, NodeConnection
 from fedstellar.utils.observer import Events, Observer
 
+logger = logging.getLogger(__name__)
+
+# Network conditions (tcset) are applied to the whole interface, so only once per interface and process: interface -> network_args applied
+_tcset_lock = threading.Lock()
+_tcset_applied = {}
+
+
+def _resolve(host):
+    """
+    Returns the IPv4 address of the host. The DNS lookup is skipped if the host is already a dotted-quad address.
+    """
+    try:
+        socket.inet_pton(socket.AF_INET, host)
+        return host
+    except OSError:
+        return socket.gethostbyname(host)
+
+
+def _apply_network_conditions(network_args):
+    """
+    Runs tcset (in background) to emulate the network conditions of the participant. The conditions apply to the whole interface,
+    so only the first call of the process for each interface has effect (later calls with other conditions are logged and ignored).
+    """
+    interface = str(network_args['interface'])
+    with _tcset_lock:
+        applied = _tcset_applied.get(interface)
+        if applied is None:
+            _tcset_applied[interface] = network_args
+    if applied is not None:
+        if applied != network_args:
+            logger.warning("[BASENODE] Network conditions of %s already applied (%s), ignoring %s", interface, applied, network_args)
+        return
+    try:
+        subprocess.Popen(["tcset",
+                          "--device", interface,
+                          "--rate", str(network_args['rate']),
+                          "--delay", str(network_args['delay']),
+                          "--delay-distro", str(network_args['delay-distro']),
+                          "--loss", str(network_args['loss'])],
+                         stdout=subprocess.DEVNULL)
+    except OSError as e:
+        # tcset not installed (or not executable): the node works without the network conditions
+        logger.error("[BASENODE] Network conditions not applied, tcset could not be run: %s", e)
+
+
+class BufferedFileHandler(FileHandler):
+    """
+    FileHandler that writes through a large buffer instead of after every record. The buffer is written to the file every ``flush_interval`` seconds
+    (the log is followed live by the webserver), right after a record of level ``WARNING`` or higher, when it is full, on ``flush_buffer`` and on close.
+
+    Args:
+        buffering (int): Size of the buffer in bytes.
+        flush_interval (float): Maximum time (in seconds) that a record stays in the buffer.
+    """
+
+    def __init__(self, filename, mode='a', encoding=None, delay=False, buffering=1 << 20, flush_interval=1.0):
+        self.buffering = buffering
+        self.flush_interval = flush_interval
+        FileHandler.__init__(self, filename, mode=mode, encoding=encoding, delay=delay)
+        self.__closed = threading.Event()
+        threading.Thread(target=self.__flush_loop, name="log-flush-" + os.path.basename(filename), daemon=True).start()
+
+    def _open(self):
+        return open(self.baseFilename, self.mode, buffering=self.buffering, encoding=self.encoding, errors=self.errors)
+
+    def __flush_loop(self):
+        while not self.__closed.wait(self.flush_interval):
+            self.flush_buffer()
+
+    def emit(self, record):
+        FileHandler.emit(self, record)
+        if record.levelno >= logging.WARNING:
+            self.flush_buffer()
+
+    def flush(self):
+        # Called by emit after every record, the buffer is written by flush_buffer (periodically, on warnings and on close)
+        pass
+
+    def flush_buffer(self):
+        """
+        Writes the buffered records to the file.
+        """
+        with self.lock:
+            if self.stream and hasattr(self.stream, "flush"):
+                self.stream.flush()
+
+    def close(self):
+        self.__closed.set()
+        FileHandler.close(self)
+
 
 class BaseNode(threading.Thread, Observer):
     """
@@ -56,14 +147,15 @@ class BaseNode(threading.Thread, Observer):
         self.experiment_name = experiment_name
         # Node Attributes
         self.hostdemo = hostdemo
-        self.host = socket.gethostbyname(host)
+        self.host = _resolve(host)
         self.port = port
         self.encrypt = encrypt
         self.simulation = config.participant["scenario_args"]["simulation"]
         self.config = config
+        self._block_size = config.participant["BLOCK_SIZE"]
 
         # Super init
-        threading.Thread.__init__(self, name="node-" + self.get_name())
+        threading.Thread.__init__(self, name="node-" + str(self.host) + ":" + str(self.port))
         self._terminate_flag = threading.Event()
 
         # Setting Up Node Socket (listening)
@@ -74,41 +166,59 @@ class BaseNode(threading.Thread, Observer):
             self.__node_socket.bind((host, 0))  # gets a random free port
             self.port = self.__node_socket.getsockname()[1]
         else:
-            logging.info("[BASENODE] Trying to bind to {}:{}".format(host, port))
+            logger.info("[BASENODE] Trying to bind to %s:%s", host, port)
             self.__node_socket.bind((host, port))
         self.__node_socket.listen(50)  # no more than 50 connections at queue
+        self._name = str(self.host) + ":" + str(self.port)  # cached, the address is final from now on
 
         # Setting up network resources
         if not self.simulation and config.participant["network_args"]:
-            logging.info("[BASENODE] Network parameters\n{}".format(config.participant["network_args"]))
-            logging.info("[BASENODE] Running tcconfig to set network parameters")
-            os.system(f"tcset --device {config.participant['network_args']['interface']} --rate {config.participant['network_args']['rate']} --delay {config.participant['network_args']['delay']} --delay-distro {config.participant['network_args']['delay-distro']} --loss {config.participant['network_args']['loss']}")
+            logger.info("[BASENODE] Network parameters\n%s", config.participant["network_args"])
+            logger.info("[BASENODE] Running tcconfig to set network parameters")
+            _apply_network_conditions(config.participant["network_args"])
 
         # Neighbors
-        self.__neighbors = []  # private to avoid concurrency issues
-        self.__nei_lock = threading.Lock()
+        # Copy-on-write: writers build a new dict under __nei_lock and publish it, readers never lock
+        self.__neighbors = {}  # (host, port) -> NodeConnection. Never mutated once published
+        self.__neighbors_snapshot = ()  # values of the published dict
+        self.__nei_lock = threading.Lock()  # serializes writers only
 
         # Logging
         self.log_dir = os.path.join(config.participant['tracking_args']["log_dir"], self.experiment_name)
-        if not os.path.exists(self.log_dir):
-            os.makedirs(self.log_dir)
+        os.makedirs(self.log_dir, exist_ok=True)  # log_filename lives directly in log_dir
         self.log_filename = f"{self.log_dir}/participant_{config.participant['device_args']['idx']}" if self.hostdemo else f"{self.log_dir}/participant_{config.participant['device_args']['idx']}"
-        os.makedirs(os.path.dirname(self.log_filename), exist_ok=True)
-        console_handler, file_handler, file_handler_only_debug, exp_errors_file_handler = self.setup_logging(self.log_filename)
+        console_handler, queue_handler = self.setup_logging(self.log_filename)
 
         level = logging.DEBUG if config.participant["scenario_args"]["debug"] else logging.WARNING
         logging.basicConfig(level=level,
                             handlers=[
                                 console_handler,
-                                file_handler,
-                                file_handler_only_debug,
-                                exp_errors_file_handler
+                                queue_handler
                             ])
 
         # Heartbeater and Gossiper
         self.gossiper = None
         self.heartbeater = None
 
+        # Reactor that receives the messages of all the neighbors
+        self.__reactor = ConnectionReactor(self.get_name())
+
+        # Observer events handled by the node (event -> handler)
+        self._event_handlers = {
+            Events.END_CONNECTION_EVENT: self._on_end_connection,
+            Events.NODE_CONNECTED_EVENT: self._on_node_connected,
+            Events.CONN_TO_EVENT: self._on_conn_to,
+            Events.SEND_BEAT_EVENT: self._on_send_beat,
+            Events.GOSSIP_BROADCAST_EVENT: self._on_gossip_broadcast,
+            Events.PROCESSED_MESSAGES_EVENT: self._on_processed_messages,
+            Events.BEAT_RECEIVED_EVENT: self._on_beat_received,
+        }
+
+        # Handshake reception (event loop over the listening socket and the connections in handshake)
+        self.__selector = selectors.DefaultSelector()
+        self.__pending_handshakes = {}  # socket -> bytearray with the partial handshake frame
+        self._process_cb = self.__process_new_connection
+
     def get_addr(self):
         """
         Returns:
@@ -121,7 +231,7 @@ class BaseNode(threading.Thread, Observer):
         Returns:
             str: The name of the node.
         """
-        return str(self.get_addr()[0]) + ":" + str(self.get_addr()[1])
+        return self._name
 
     def get_name_demo(self):
         """
@@ -141,7 +251,9 @@ class BaseNode(threading.Thread, Observer):
         console_handler.setLevel(logging.INFO)
         console_handler.setFormatter(Formatter(log_console_format))
 
-        file_handler = FileHandler('{}.log'.format(log_dir), mode='w')
+        # The info log has by far the highest rate, so it is written through a big buffer
+        file_handler = BufferedFileHandler('{}.log'.format(log_dir), mode='w')
+        file_handler.terminator = "\n"
         file_handler.setLevel(logging.INFO)
         file_handler.setFormatter(Formatter(info_file_format))
 
@@ -155,7 +267,27 @@ class BaseNode(threading.Thread, Observer):
         exp_errors_file_handler.setLevel(logging.WARNING)
         exp_errors_file_handler.setFormatter(Formatter(debug_file_format))
 
-        return console_handler, file_handler, file_handler_only_debug, exp_errors_file_handler
+        # The file handlers are served by a single background listener, so logging calls only enqueue the record
+        log_queue = queue.SimpleQueue()
+        self._log_listener = QueueListener(log_queue, file_handler, file_handler_only_debug, exp_errors_file_handler, respect_handler_level=True)
+        self._log_listener.start()
+        self._log_file_handler = file_handler
+        self._log_lock = threading.Lock()
+        atexit.register(self.flush_logs)
+
+        queue_handler = QueueHandler(log_queue)
+        queue_handler.setFormatter(Formatter("%(message)s"))  # keep the message as is, the file handlers apply their own format
+        return console_handler, queue_handler
+
+    def flush_logs(self):
+        """
+        Writes all the pending log records (queued and buffered) to the log files. Called on exit (atexit or SIGTERM), later records are not written.
+        """
+        with self._log_lock:
+            if self._log_listener is not None:
+                self._log_listener.stop()  # processes the queued records
+                self._log_listener = None
+        self._log_file_handler.flush_buffer()
 
     #######################
     #   Node Management   #
@@ -169,10 +301,14 @@ class BaseNode(threading.Thread, Observer):
         """
         # Main Loop
         super().start()
-        # Heartbeater and Gossiper
-        self.heartbeater = Heartbeater(self.get_name(), self.__neighbors, self.config)
+        self.__reactor.start()
+        # Heartbeater and Gossiper (imported on start, they are not needed to build a node)
+        from fedstellar.gossiper import Gossiper
+        from fedstellar.heartbeater import Heartbeater
+
+        self.heartbeater = Heartbeater(self.get_name(), self.__get_neighbors_snapshot, self.config)
         self.gossiper = Gossiper(
-            self.get_name(), self.__neighbors, self.config
+            self.get_name(), self.__get_neighbors_snapshot, self.config
         )  # thread safe, only read
         self.heartbeater.add_observer(self)
         self.gossiper.add_observer(self)
@@ -199,95 +335,132 @@ class BaseNode(threading.Thread, Observer):
         Main loop of the node, when a node is running, this method is being executed. It will listen for new connections and process them.
         """
         # Process new connections loop
-        logging.info("[BASENODE] Node started")
-        while not self._terminate_flag.is_set():
+        logger.info("[BASENODE] Node started")
+        self.__node_socket.setblocking(False)
+        self.__selector.register(self.__node_socket, selectors.EVENT_READ, self.__on_accept)
+        # Bound once, the loop runs for the whole life of the node
+        select = self.__selector.select
+        terminate_is_set = self._terminate_flag.is_set
+        while not terminate_is_set():
             try:
-                (ns, _) = self.__node_socket.accept()
-                msg = ns.recv(self.config.participant["BLOCK_SIZE"])
-
-                # Process new connection
-                if msg:
-                    msg = msg.decode("UTF-8")
-                    callback = lambda h, p, fu, fc: self.__process_new_connection(
-                        ns, h, p, fu, fc
-                    )
-                    if not CommunicationProtocol.process_connection(msg, callback):
-                        ns.close()
+                for key, _ in select():
+                    key.data(key.fileobj)
             except Exception as e:
-                logging.exception(e)
+                logger.exception(e)
+
+        for ns in list(self.__pending_handshakes):
+            ns.close()
+        self.__pending_handshakes.clear()
+        self.__selector.close()
 
         # Stop Heartbeater and Gossiper
         self.heartbeater.stop()
         self.gossiper.stop()
 
         # Stop Node
-        logging.info(
-            "[BASENODE] Stopping node. Disconnecting from {} nodos".format(
-                len(self.__neighbors)
-            )
-        )
+        logger.info("[BASENODE] Stopping node. Disconnecting from %d nodos", len(self.__neighbors))
         nei_copy_list = self.get_neighbors()
         for n in nei_copy_list:
             n.stop()
+        self.__reactor.stop()
         self.__node_socket.close()
+        self._log_file_handler.flush_buffer()
+
+    def __on_accept(self, node_socket):
+        """
+        Accepts a new connection. Its handshake frame is received by the event loop (it doesn't block other connections).
+        """
+        try:
+            (ns, _) = node_socket.accept()
+        except BlockingIOError:
+            return
+        ns.setblocking(False)
+        self.__pending_handshakes[ns] = bytearray()
+        self.__selector.register(ns, selectors.EVENT_READ, self.__on_handshake_data)
+
+    def __on_handshake_data(self, ns):
+        """
+        Receives data of a connection in handshake. Once the ``CONNECT`` frame is complete, the connection is processed.
+        """
+        frame = self.__pending_handshakes[ns]
+        block_size = self._block_size
+        try:
+            # Only the CONNECT line is consumed, next messages of the peer belong to the NodeConnection
+            chunk = ns.recv(block_size - len(frame), socket.MSG_PEEK)
+            end = chunk.find(b"\n")
+            chunk = ns.recv(end + 1 if end != -1 else len(chunk))
+        except BlockingIOError:
+            return
+        except OSError:
+            chunk = b""
+        frame += chunk
+        if chunk and not frame.endswith(b"\n") and len(frame) < block_size:
+            return  # frame not complete yet
+
+        self.__selector.unregister(ns)
+        del self.__pending_handshakes[ns]
+        if not frame:
+            ns.close()
+            return
+
+        # Process new connection in its own thread: the key exchange uses a blocking socket (bounded by NODE_TIMEOUT), so a slow peer doesn't stall the accepts
+        ns.settimeout(self.config.participant["NODE_TIMEOUT"])
+        threading.Thread(target=self.__process_connection_frame, args=(frame, ns), name="handshake-{}".format(self.get_name()), daemon=True).start()
+
+    def __process_connection_frame(self, frame, ns):
+        if not CommunicationProtocol.process_connection_bytes(frame, ns, self._process_cb):
+            ns.close()
 
     def __process_new_connection(self, node_socket, h, p, full, force):
+        nc = None
         try:
-            # Check if connection with the node already exist
-            self.__nei_lock.acquire()
-            if self.get_neighbor(h, p, thread_safe=False) is None:
+            # Check if connection with the node already exist (checked again, locked, before adding it)
+            if self.get_neighbor(h, p) is not None:
+                node_socket.close()
+                return
 
-                # Check if ip and port are correct
-                s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                s.settimeout(2)
-                result = s.connect_ex((h, p))
-                s.close()
+            # No reverse reachability probe: the peer has already reached us through node_socket
 
-                # Encryption
-                aes_cipher = None
-                if self.encrypt:
-                    # Asymmetric
-                    rsa = RSACipher()
-                    node_socket.sendall(rsa.get_key())
-                    rsa.load_pair_public_key(node_socket.recv(len(rsa.get_key())))
+            # Encryption (out of __nei_lock: the key exchange waits for the other node)
+            aes_cipher = None
+            if self.encrypt:
+                from fedstellar.encrypter import AESCipher, RSACipher
+
+                # Asymmetric
+                rsa = RSACipher()
+                node_socket.sendall(rsa.get_key())
+                rsa.load_pair_public_key(node_socket.recv(len(rsa.get_key()), socket.MSG_WAITALL))
 
-                    # Symmetric
-                    aes_cipher = AESCipher()
-                    node_socket.sendall(aes_cipher.get_key())
+                # Symmetric (the key is sent wrapped with the RSA public key of the other node)
+                aes_cipher = AESCipher()
+                node_socket.sendall(rsa.wrap_key(aes_cipher.get_key()))
+
+            with self.__nei_lock:
+                if self.get_neighbor(h, p, thread_safe=False) is not None:
+                    node_socket.close()
+                    return
 
                 # Add neighbor
-                if result == 0:
-                    logging.info(
-                        "{} Connection accepted with {}:{}".format(
-                            self.get_name(), h, p
-                        )
-                    )
-                    nc = NodeConnection(
-                        self.get_name(), node_socket, (h, p), aes_cipher, config=self.config
-                    )
-                    nc.add_observer(self)
-                    logging.info("[BASENODE.__process_new_connection] New neighbor: {}".format(nc.get_name()))
-                    self.__neighbors.append(nc)
-                    nc.start(force=force)
-
-                    if full:
-                        self.broadcast(
-                            CommunicationProtocol.build_connect_to_msg(h, p),
-                            exc=[nc],
-                            thread_safe=False,
-                        )
-            else:
-                node_socket.close()
+                logger.info("%s Connection accepted with %s:%s", self.get_name(), h, p)
+                nc = NodeConnection(
+                    self.get_name(), node_socket, (h, p), aes_cipher, config=self.config, reactor=self.__reactor
+                )
+                nc.add_observer(self)
+                logger.info("[BASENODE.__process_new_connection] New neighbor: %s", nc.get_name())
+                self.__add_neighbor(nc)
+                nc.start(force=force)
 
-            self.__nei_lock.release()
+            if full:
+                self.broadcast(
+                    CommunicationProtocol.build_connect_to_msg(h, p),
+                    exc=[nc],
+                )
 
         except Exception as e:
-            logging.info(
-                "[BASENODE] Connection refused with {}:{}".format(h, p)
-            )
-            self.__nei_lock.release()
+            logger.info("[BASENODE] Connection refused with %s:%s", h, p)
             node_socket.close()
-            self.rm_neighbor(nc)
+            if nc is not None:
+                self.rm_neighbor(nc)
 
     #############################
     #  Neighborhood management  #
@@ -331,9 +504,14 @@ class BaseNode(threading.Thread, Observer):
         else:
             force = "0"
 
+        # Fast path (no lock, no DNS): the published dict is keyed by (host, port)
+        if (h, p) in self.__neighbors:
+            logger.info("%s Already connected to %s:%s", self.get_name(), h, p)
+            return None
+
         try:
             # Check if connection with the node already exist
-            h = socket.gethostbyname(h)
+            h = _resolve(h)
             self.__nei_lock.acquire()
             if self.get_neighbor(h, p, thread_safe=False) is None:
 
@@ -346,32 +524,30 @@ class BaseNode(threading.Thread, Observer):
                 # Encryption
                 aes_cipher = None
                 if not self.simulation:
+                    from fedstellar.encrypter import AESCipher, RSACipher
+
                     # Asymmetric
                     rsa = RSACipher()
-                    rsa.load_pair_public_key(s.recv(len(rsa.get_key())))
+                    rsa.load_pair_public_key(s.recv(len(rsa.get_key()), socket.MSG_WAITALL))
                     s.sendall(rsa.get_key())
-                    # Symmetric
-                    aes_cipher = AESCipher(key=s.recv(AESCipher.key_len()))
+                    # Symmetric (the key is received wrapped with our RSA public key)
+                    aes_cipher = AESCipher(key=rsa.unwrap_key(s.recv(rsa.wrapped_key_len(), socket.MSG_WAITALL)))
 
                 # Add socket to neighbors
-                nc = NodeConnection(self.get_name(), s, (h, p), aes_cipher, config=self.config)
+                nc = NodeConnection(self.get_name(), s, (h, p), aes_cipher, config=self.config, reactor=self.__reactor)
                 nc.add_observer(self)
-                logging.info("[BASENODE_connect_to] Connected to {}:{} -> New neighbor {}".format(h, p, nc.get_name()))
-                self.__neighbors.append(nc)
+                logger.info("[BASENODE_connect_to] Connected to %s:%s -> New neighbor %s", h, p, nc.get_name())
+                self.__add_neighbor(nc)
                 nc.start(force=force)
                 self.__nei_lock.release()
                 return nc
 
             else:
-                logging.info(
-                    "{} Already connected to {}:{}".format(self.get_name(), h, p)
-                )
+                logger.info("%s Already connected to %s:%s", self.get_name(), h, p)
                 self.__nei_lock.release()
                 return None
         except Exception as e:
-            logging.info(
-                "{} Can't connect to the node {}:{}".format(self.get_name(), h, p)
-            )
+            logger.info("%s Can't connect to the node %s:%s", self.get_name(), h, p)
             # logging.exception(e)
             try:
                 self.__nei_lock.release()
@@ -396,45 +572,26 @@ class BaseNode(threading.Thread, Observer):
          Args:
              h (str): The host of the node.
              p (int): The port of the node.
-            thread_safe (bool): If True, the method will be thread safe.
+            thread_safe (bool): Kept for compatibility. Reads use the published dict, so they are always thread safe.
 
          Returns:
              NodeConnection: The connection with the node.
          """
-
-        if thread_safe:
-            self.__nei_lock.acquire()
-
-        return_node = None
-        for n in self.__neighbors:
-            if n.get_addr() == (h, p):
-                return_node = n
-                break
-
-        if thread_safe:
-            self.__nei_lock.release()
-
-        return return_node
+        return self.__neighbors.get((h, p))
 
     def get_neighbors(self):
         """
         Returns:
             list: The neighbors of the node.
         """
-        self.__nei_lock.acquire()
-        n = self.__neighbors.copy()
-        self.__nei_lock.release()
-        return n
+        return list(self.__neighbors_snapshot)
 
     def get_neighbors_names(self):
         """
         Returns:
             list: The names of the neighbors of the node.
         """
-        self.__nei_lock.acquire()
-        n = [nc.get_name() for nc in self.__neighbors]
-        self.__nei_lock.release()
-        return n
+        return [nc._name for nc in self.__neighbors_snapshot]
 
     def rm_neighbor(self, n):
         """
@@ -445,13 +602,30 @@ class BaseNode(threading.Thread, Observer):
         """
         self.__nei_lock.acquire()
         try:
-            logging.info("[BASENODE.rm_neighbor] Remove neighbor: {}".format(n.get_name()))
-            self.__neighbors.remove(n)
-            n.stop()
+            logger.info("[BASENODE.rm_neighbor] Remove neighbor: %s", n.get_name())
+            if self.__neighbors.get(n.get_addr()) is n:
+                neighbors = dict(self.__neighbors)
+                del neighbors[n.get_addr()]
+                self.__publish_neighbors(neighbors)
+                n.stop()
         except Exception as e:
             pass
         self.__nei_lock.release()
 
+    def __add_neighbor(self, nc):
+        # Must be called holding __nei_lock
+        neighbors = dict(self.__neighbors)
+        neighbors[nc.get_addr()] = nc
+        self.__publish_neighbors(neighbors)
+
+    def __publish_neighbors(self, neighbors):
+        # Must be called holding __nei_lock. Neither the dict nor the tuple are mutated afterwards, so readers can use them without locking.
+        self.__neighbors = neighbors
+        self.__neighbors_snapshot = tuple(neighbors.values())
+
+    def __get_neighbors_snapshot(self):
+        return self.__neighbors_snapshot
+
     def get_network_nodes(self):
         """
         Returns:
@@ -463,27 +637,21 @@ class BaseNode(threading.Thread, Observer):
     #     Msg management     #
     ##########################
 
-    def broadcast(self, msg, exc=[], thread_safe=True):
+    def broadcast(self, msg, exc=[]):
         """
-        Broadcasts a message to all the neighbors.
+        Broadcasts a message to all the neighbors. It works over the last published snapshot of the neighbors, so it doesn't block (and isn't blocked by) connections or disconnections.
 
         Args:
             msg (str): The message to be broadcast.
             exc (list): The neighbors to be excluded.
-            thread_safe (bool): If True, the broadcast will access the neighbors list in a thread safe mode.
 
         """
-        if thread_safe:
-            self.__nei_lock.acquire()
-
-        logging.debug("[BASENODE.broadcast] {} --> to: {} | Excluded: {}".format(msg, self.__neighbors, exc))
+        neighbors = [n for n in self.__neighbors_snapshot if n not in exc]
+        logger.debug("[BASENODE.broadcast] %s --> to: %s | Excluded: %s", msg, neighbors, exc)
 
-        for n in self.__neighbors:
-            if not (n in exc):
-                n.send(msg)
-
-        if thread_safe:
-            self.__nei_lock.release()
+        msg_view = memoryview(msg)  # shared by all the neighbors
+        for n in neighbors:
+            n.send_mv(msg_view)
 
     ###########################
     #     Observer Events     #
@@ -497,43 +665,56 @@ class BaseNode(threading.Thread, Observer):
             event (Events): Event that has occurred.
             obj: Information about the change or event.
         """
-        if len(str(obj)) > 300:
-            logging.debug("[BASENODE.update (observer)] Event that has occurred: {} | Obj information: Too long [...]".format(event))
-        else:
-            logging.debug("[BASENODE.update (observer)] Event that has occurred: {} | Obj information: {}".format(event, obj))
-
-        if event == Events.END_CONNECTION_EVENT:
-            self.rm_neighbor(obj)
-
-        elif event == Events.NODE_CONNECTED_EVENT:
-            # Este evento lo notifica NodeConnection. Previamente se ha tenido que conectar con el nodo.
-            logging.debug("[BASENODE.update (observer) | Events.NODE_CONNECTED_EVENT] Connecting to: {}".format(obj[0]))
-            n, _ = obj
-            n.send(CommunicationProtocol.build_beat_msg(self.get_name()))
-
-        elif event == Events.CONN_TO_EVENT:
-            logging.debug("[BASENODE.update (observer) | Events.CONN_TO_EVENT] Connecting to: {} {}".format(obj[0], obj[1]))
-            self.connect_to(obj[0], obj[1], full=False)
-
-        elif event == Events.SEND_BEAT_EVENT:
-            self.broadcast(CommunicationProtocol.build_beat_msg(self.get_name()))
-
-        elif event == Events.GOSSIP_BROADCAST_EVENT:
-            self.broadcast(obj[0], exc=obj[1])
-
-        elif event == Events.PROCESSED_MESSAGES_EVENT:
-            node, msgs = obj
-            # Communicate to connections the new messages processed
-            for nc in self.__neighbors:
-                if nc != node:
-                    nc.add_processed_messages(list(msgs.keys()))
-            # Gossip the new messages
+        if logger.isEnabledFor(logging.DEBUG):
+            if len(str(obj)) > 300:
+                logger.debug("[BASENODE.update (observer)] Event that has occurred: %s | Obj information: Too long [...]", event)
+            else:
+                logger.debug("[BASENODE.update (observer)] Event that has occurred: %s | Obj information: %s", event, obj)
+
+        handler = self._event_handlers.get(event)
+        if handler is not None:
+            handler(obj)
+
+    def _on_end_connection(self, obj):
+        self.rm_neighbor(obj)
+
+    def _on_node_connected(self, obj):
+        # Este evento lo notifica NodeConnection. Previamente se ha tenido que conectar con el nodo.
+        logger.debug("[BASENODE.update (observer) | Events.NODE_CONNECTED_EVENT] Connecting to: %s", obj[0])
+        n, _ = obj
+        n.send(CommunicationProtocol.build_beat_msg(self.get_name()))
+
+    def _on_conn_to(self, obj):
+        logger.debug("[BASENODE.update (observer) | Events.CONN_TO_EVENT] Connecting to: %s %s", obj[0], obj[1])
+        # Blocking connect + handshake: run in its own thread so the reactor (shared by all the connections) keeps reading, beats included
+        threading.Thread(
+            target=self.connect_to, args=(obj[0], obj[1]), kwargs={"full": False}, name="connect_to-{}:{}".format(obj[0], obj[1]), daemon=True
+        ).start()
+
+    def _on_send_beat(self, obj):
+        self.broadcast(CommunicationProtocol.build_beat_msg(self.get_name()))
+
+    def _on_gossip_broadcast(self, obj):
+        # All the messages of the round for a neighbor are joined and sent at once (gossiped messages are text commands ended by a newline)
+        for n in self.__neighbors_snapshot:
+            data = [msg for msg, exc in obj if n not in exc]
+            if data:
+                n.send(b"".join(data))
+
+    def _on_processed_messages(self, obj):
+        node, msgs = obj
+        # Communicate to connections the new messages processed
+        for nc in self.__neighbors_snapshot:
+            if nc != node:
+                nc.add_processed_messages(list(msgs.keys()))
+        # Gossip the new messages
+        if logger.isEnabledFor(logging.DEBUG):
             if len(str(obj)) > 300:
-                logging.debug("[BASENODE.update (observer) | Events.PROCESSED_MESSAGES_EVENT] Add messages to gossiper: Too long [...] | Node: {}".format(node))
+                logger.debug("[BASENODE.update (observer) | Events.PROCESSED_MESSAGES_EVENT] Add messages to gossiper: Too long [...] | Node: %s", node)
             else:
-                logging.debug("[BASENODE.update (observer) | Events.PROCESSED_MESSAGES_EVENT] Add messages to gossiper: {} | Node: {}".format(list(msgs.values()), node))
-            self.gossiper.add_messages(list(msgs.values()), node)
+                logger.debug("[BASENODE.update (observer) | Events.PROCESSED_MESSAGES_EVENT] Add messages to gossiper: %s | Node: %s", list(msgs.values()), node)
+        self.gossiper.add_messages(list(msgs.values()), node)
 
-        elif event == Events.BEAT_RECEIVED_EVENT:
-            # Update the heartbeater with the active neighbor
-            self.heartbeater.add_node(obj)
+    def _on_beat_received(self, obj):
+        # Update the heartbeater with the active neighbor
+        self.heartbeater.add_node(obj)
@@ -16,12 +16,53 @@
 #
 
 
+import functools
+import itertools
 import logging
+import os
 import random
-import threading
-from datetime import datetime
+import re
+import struct
+from typing import Any, Callable, Dict, Final, Iterator, List, Match, Optional, Tuple
 
 from fedstellar.config.config import Config
+from fedstellar.utils.recentset import RecentSet
+
+
+# Parsed command: (action, hash, cmd_text, args)
+_Command = Tuple[str, Optional[bytes], Optional[bytes], Tuple[Any, ...]]
+
+
+# Messages with a list of items are prefixed by the number of items (parsed without searching a closing token).
+# The pattern for each number of items is compiled once.
+@functools.lru_cache(maxsize=64)
+def _vote_train_set_re(count):
+    return re.compile(
+        rb"\s+(?P<vote_train_set_node>\S+)\s+\S+(?P<vote_train_set_votes>(?:\s+\S+\s+\S+){%d})\s+(?P<vote_train_set_hash>\S+)(?:\n|(?!\S))" % count
+    )
+
+
+@functools.lru_cache(maxsize=64)
+def _models_aggregated_re(count):
+    return re.compile(rb"\s+\S+(?P<models_aggregated_nodes>(?:\s+\S+){%d})(?!\S)" % count)
+
+
+_VOTE_TRAIN_SET_COUNT_RE = re.compile(rb"\s+\S+\s+(\S+)(?!\S)")
+_MODELS_AGGREGATED_COUNT_RE = re.compile(rb"\s+(\S+)(?!\S)")
+
+
+def _match_counted(count_re, items_re, msg, pos):
+    # Number of items, then the pattern with exactly that number of items (each item takes at least 2 bytes)
+    m = count_re.match(msg, pos)
+    if m is None:
+        return None
+    try:
+        count = int(m.group(1))
+    except ValueError:
+        return None
+    if not 0 <= count <= len(msg) // 2:
+        return None
+    return items_re(count).match(msg, pos)
 
 
 ###############################
@@ -40,16 +81,16 @@ class CommunicationProtocol:
             - ROLE <node> <role> <HASH>
             - START_LEARNING <rounds> <epoches> <HASH>
             - STOP_LEARNING <HASH>
-            - VOTE_TRAIN_SET <node> (<node> <punct>)* VOTE_TRAIN_SET_CLOSE <HASH>
+            - VOTE_TRAIN_SET <node> <count> (<node> <punct>)* <HASH>
             - METRICS <node> <round> <loss> <metric> <HASH>
 
         Non Gossiped messages (communication over only 2 nodes):
             - CONNECT <ip> <port> <full> <force>
             - CONNECT_TO <ip> <port>
             - STOP
-            - PARAMS <data> \PARAMS
+            - PARAMS <length> <last> <data> (binary header: ``PARAMS_HEADER``)
             - MODELS_READY <round>
-            - MODELS_AGGREGATED <node>* MODELS_AGGREGATED_CLOSE
+            - MODELS_AGGREGATED <count> <node>*
             - MODEL_INITIALIZED
 
     Furthermore, all messages consist of encoded text (utf-8), except the `PARAMS` message, which contains serialized binaries.
@@ -61,105 +102,104 @@ class CommunicationProtocol:
 
     Attributes:
         command_dict: Dictionary with the callbacks to execute at `process_message`.
-        last_messages: List of the last messages received.
+        last_messages: Bounded set (``RecentSet``) with the hashes of the last messages received.
     """
 
     """
         Transfer leadership header.
     """
-    TRANSFER_LEADERSHIP = "TRANSFER_LEADERSHIP"
+    TRANSFER_LEADERSHIP: Final[str] = "TRANSFER_LEADERSHIP"
     """
     Beat message header.
     """
-    BEAT = "BEAT"
+    BEAT: Final[str] = "BEAT"
     """
     Role message header.
     """
-    ROLE = "ROLE"
+    ROLE: Final[str] = "ROLE"
     """
     Stop message header.
     """
-    STOP = "STOP"
+    STOP: Final[str] = "STOP"
     """
     Connection message header.
     """
-    CONN = "CONNECT"
+    CONN: Final[str] = "CONNECT"
+    CONN_B: Final[bytes] = CONN.encode("utf-8")  # encoded header (handshake is parsed over bytes)
     """
     Connection to message header.
     """
-    CONN_TO = "CONNECT_TO"
+    CONN_TO: Final[str] = "CONNECT_TO"
     """
     Start learning message header.
     """
-    START_LEARNING = "START_LEARNING"
+    START_LEARNING: Final[str] = "START_LEARNING"
     """
     Stop learning message header.
     """
-    STOP_LEARNING = "STOP_LEARNING"
+    STOP_LEARNING: Final[str] = "STOP_LEARNING"
     """
     Parameters message header.
     """
-    PARAMS = "PARAMS"  # special case (binary)
+    PARAMS: Final[str] = "PARAMS"  # special case (binary)
+    PARAMS_B: Final[bytes] = PARAMS.encode("utf-8")  # encoded header (binary messages are checked over bytes)
     """
-    Parameters message closing.
+    Parameters message framing (after the header): length of the data of the block (u32) and last block flag (u8).
     """
-    PARAMS_CLOSE = "\PARAMS"  # special case (binary)
+    PARAMS_HEADER: Final[struct.Struct] = struct.Struct("<IB")
+    _PARAMS_LEN: Final[int] = len(PARAMS_B) + PARAMS_HEADER.size
     """
     Models ready message header.
     """
-    MODELS_READY = "MODELS_READY"
+    MODELS_READY: Final[str] = "MODELS_READY"
     """
     Metrics message header.
     """
-    METRICS = "METRICS"
+    METRICS: Final[str] = "METRICS"
     """
     Vote train set message header.
     """
-    VOTE_TRAIN_SET = "VOTE_TRAIN_SET"
-    """
-    Vote train set message closing.
-    """
-    VOTE_TRAIN_SET_CLOSE = "\VOTE_TRAIN_SET"
+    VOTE_TRAIN_SET: Final[str] = "VOTE_TRAIN_SET"
     """
     Models aggregated message header.
     """
-    MODELS_AGGREGATED = "MODELS_AGGREGATED"
+    MODELS_AGGREGATED: Final[str] = "MODELS_AGGREGATED"
     """
-    Models aggregated message closing.
+    Model initialized message header.
     """
-    MODELS_AGGREGATED_CLOSE = "\MODELS_AGGREGATED"
+    MODEL_INITIALIZED: Final[str] = "MODEL_INITIALIZED"
+
     """
-    Model initialized message header.
+    Message ids (gossiped messages): random prefix of the process + sequence number (unique per process).
     """
-    MODEL_INITIALIZED = "MODEL_INITIALIZED"
+    _node_prefix: Final[str] = f"{os.getpid():x}{random.getrandbits(16):04x}-"
+    _msg_seq = itertools.count(random.getrandbits(32))
 
     ############################################
     #    MSG PROCESSING (Non Static Methods)   #
     ############################################
 
-    def __init__(self, command_dict, config: Config):
+    def __init__(self, command_dict: Dict[str, Any], config: Config) -> None:
         self.command_dict = command_dict
         self.config = config
-        self.last_messages = []
-        self.__last_messages_lock = threading.Lock()
+        # Exact: the same check decides if a command is executed, so a message can't be taken as processed by mistake
+        self.last_messages = RecentSet(self.config.participant["AMOUNT_LAST_MESSAGES_SAVED"])
 
-    def add_processed_messages(self, messages):
+    def add_processed_messages(self, messages: List[bytes]) -> None:
         """
-        Add messages to the last messages list. If ammount is higher than ``AMOUNT_LAST_MESSAGES_SAVED`` remove the oldest to keep the size.
+        Add messages to the last messages set. At least the last ``AMOUNT_LAST_MESSAGES_SAVED`` are remembered.
 
         Args:
             messages: List of hashes of the messages.
+
+        Note:
+            It is called by the workers of several connections (``PROCESSED_MESSAGES_EVENT``), the set is locked.
         """
-        self.__last_messages_lock.acquire()
-        self.last_messages = self.last_messages + messages
-        # Remove oldest messages
-        if len(self.last_messages) > self.config.participant["AMOUNT_LAST_MESSAGES_SAVED"]:
-            self.last_messages = self.last_messages[
-                                 len(self.last_messages) - self.config.participant["AMOUNT_LAST_MESSAGES_SAVED"]:
-                                 ]
-        self.__last_messages_lock.release()
+        add = self.last_messages.add
+        for h in messages:
+            add(h)
 
-    def process_message(self, msg):
+    def process_message(self, msg: bytes) -> Tuple[Dict[bytes, bytes], bool]:
         """
         Processes messages and executes the callback associated with it (from ``command_dict``).
 
@@ -170,294 +210,205 @@ class CommunicationProtocol:
             tuple: (messages_executed, error) messages_executed is a list of the messages executed, error true if there was an error.
 
         """
+        return self.process_messages([msg])
+
+    def process_messages(self, msgs: List[bytes]) -> Tuple[Dict[bytes, bytes], bool]:
+        """
+        Processes a batch of messages (buffers received from the same connection) in order. Same as ``process_message``, but the result is built once
+        for the whole batch.
+
+        Args:
+            msgs: List of messages to process.
+
+        Returns:
+            tuple: (messages_executed, error) messages_executed is a dict (hash: message) of the gossiped messages executed, error true if there was an error (the rest of the batch is not processed).
+        """
         self.tmp_exec_msgs = {}
-        error = False
+        for msg in msgs:
+            for cmd in self.iter_process_message(msg):
+                if cmd is None or not self.__exec(*cmd):
+                    return self.tmp_exec_msgs, True
+        return self.tmp_exec_msgs, False
 
-        # Determine if is a binary message or not
-        header = CommunicationProtocol.PARAMS.encode("utf-8")
-        if msg[0: len(header)] == header:
-            end = CommunicationProtocol.PARAMS_CLOSE.encode("utf-8")
-
-            # Check if done
-            end_pos = msg.find(end)
-            if end_pos != -1:
-                return [], not self.__exec(
-                    CommunicationProtocol.PARAMS,
-                    None,
-                    None,
-                    msg[len(header): end_pos],
-                    True,
-                )
-
-            return [], not self.__exec(
-                CommunicationProtocol.PARAMS, None, None, msg[len(header):], False
-            )
+    def iter_process_message(self, msg: bytes) -> Iterator[Optional[_Command]]:
+        """
+        Parses a message and yields each command as soon as it is parsed (the consumer can execute it before the rest of the buffer is parsed).
+        Commands are not executed nor deduplicated here: ``process_message`` executes them with the callbacks of ``command_dict``.
 
-        else:
-            # Try to decode the message
-            message = ""
-            try:
-                message = msg.decode("utf-8")
-                message = message.split()
-            except UnicodeDecodeError:
-                error = True
-
-            # Process messages
-            while len(message) > 0:
-
-                # Beat
-                if message[0] == CommunicationProtocol.BEAT:
-                    if len(message) > 2:
-                        hash_ = message[2]
-                        cmd_text = (" ".join(message[0:3]) + "\n").encode("utf-8")
-                        if self.__exec(
-                                CommunicationProtocol.BEAT, hash_, cmd_text, message[1]
-                        ):
-                            message = message[3:]  # Remove the BEAT message from the list (3 elements: BEAT <node> <hash>)
-                        else:
-                            error = True
-                            break
-                    else:
-                        error = True
-                        break
-
-                # Role
-                elif message[0] == CommunicationProtocol.ROLE:
-                    if len(message) > 3:
-                        hash_ = message[3]
-                        cmd_text = (" ".join(message[0:4]) + "\n").encode("utf-8")
-                        if self.__exec(
-                                CommunicationProtocol.ROLE, hash_, cmd_text, message[1], message[2]
-                        ):
-                            message = message[4:]  # Remove the ROLE message from the list
-                        else:
-                            error = True
-                            break
-                    else:
-                        error = True
-                        break
-
-                # Stop (non gossiped)
-                elif message[0] == CommunicationProtocol.STOP:
-                    if self.__exec(CommunicationProtocol.STOP, None, None):
-                        message = message[1:]
-                    else:
-                        error = True
-                        break
-
-                # Connect to
-                elif message[0] == CommunicationProtocol.CONN_TO:
-                    if len(message) > 2:
-                        if message[2].isdigit():
-                            if self.__exec(
-                                    CommunicationProtocol.CONN_TO,
-                                    None,
-                                    None,
-                                    message[1],
-                                    int(message[2]),
-                            ):
-                                message = message[3:]
-                            else:
-                                error = True
-                                break
-                        else:
-                            error = True
-                            break
-                    else:
-                        error = True
-                        break
-
-                # Start learning
-                elif message[0] == CommunicationProtocol.START_LEARNING:
-                    if len(message) > 3:
-                        if message[1].isdigit() and message[2].isdigit():
-                            hash_ = message[3]
-                            cmd_text = (" ".join(message[0:4]) + "\n").encode("utf-8")
-                            if self.__exec(
-                                    CommunicationProtocol.START_LEARNING,
-                                    hash_,
-                                    cmd_text,
-                                    int(message[1]),
-                                    int(message[2]),
-                            ):
-                                message = message[4:]
-                            else:
-                                error = True
-                                break
-                        else:
-                            error = True
-                            break
-                    else:
-                        error = True
-                        break
-
-                # Stop learning
-                elif message[0] == CommunicationProtocol.STOP_LEARNING:
-                    if len(message) > 1:
-                        if message[1].isdigit():
-                            hash_ = message[1]
-                            cmd_text = (" ".join(message[0:2]) + "\n").encode("utf-8")
-                            if self.__exec(
-                                    CommunicationProtocol.STOP_LEARNING, hash_, cmd_text
-                            ):
-                                message = message[2:]
-                            else:
-                                error = True
-                                break
-                        else:
-                            error = True
-                            break
-                    else:
-                        error = True
-                        break
-
-                # Models Ready
-                elif message[0] == CommunicationProtocol.MODELS_READY:
-                    if len(message) > 1:
-                        if message[1].isdigit():
-                            if self.__exec(
-                                    CommunicationProtocol.MODELS_READY,
-                                    None,
-                                    None,
-                                    int(message[1]),
-                            ):
-                                message = message[2:]
-                            else:
-                                error = True
-                                break
-                        else:
-                            error = True
-                            break
-                    else:
-                        error = True
-                        break
-
-                # Metrics
-                elif message[0] == CommunicationProtocol.METRICS:
-                    if len(message) > 5:
-                        try:
-                            hash_ = message[5]
-                            cmd_text = (" ".join(message[0:6]) + "\n").encode("utf-8")
-                            if self.__exec(
-                                    CommunicationProtocol.METRICS,
-                                    hash_,
-                                    cmd_text,
-                                    message[1],
-                                    int(message[2]),
-                                    float(message[3]),
-                                    float(message[4]),
-                            ):
-                                message = message[6:]
-                            else:
-                                error = True
-                                break
-                        except Exception as e:
-                            error = True
-                            break
-                    else:
-                        error = True
-                        break
-
-                # Vote train set
-                elif message[0] == CommunicationProtocol.VOTE_TRAIN_SET:
-                    try:
-                        # Divide messages and check length of message
-                        close_pos = message.index(
-                            CommunicationProtocol.VOTE_TRAIN_SET_CLOSE
-                        )
-                        node = message[1]
-                        vote_msg = message[2:close_pos]
-                        hash_ = message[close_pos + 1]
-                        cmd_text = (" ".join(message[0: close_pos + 2]) + "\n").encode(
-                            "utf-8"
-                        )
-
-                        if len(vote_msg) % 2 != 0:
-                            raise Exception("Invalid vote message")
-                        message = message[close_pos + 2:]
-
-                        # Process vote message
-                        votes = []
-                        for i in range(0, len(vote_msg), 2):
-                            votes.append((vote_msg[i], int(vote_msg[i + 1])))
-
-                        if not self.__exec(
-                                CommunicationProtocol.VOTE_TRAIN_SET,
-                                hash_,
-                                cmd_text,
-                                node,
-                                dict(votes),
-                        ):
-                            error = True
-                            break
-
-                    except Exception as e:
-                        logging.exception(e)
-                        error = True
-                        break
-
-                # Models Aggregated
-                elif message[0] == CommunicationProtocol.MODELS_AGGREGATED:
-                    try:
-                        # Divide messages and check length of message
-                        close_pos = message.index(
-                            CommunicationProtocol.MODELS_AGGREGATED_CLOSE
-                        )
-                        content = message[1:close_pos]
-                        message = message[close_pos + 1:]
-
-                        # Get Nodes
-                        nodes = []
-                        for n in content:
-                            nodes.append(n)
-                        logging.info("[COMM_PROTOCOL.MODELS_AGGREGATED] Received models_aggregated message with {}".format(nodes))
-                        # Exec
-                        if not self.__exec(
-                                CommunicationProtocol.MODELS_AGGREGATED, None, None, nodes
-                        ):
-                            error = True
-                            break
-
-                    except Exception as e:
-                        logging.exception(e)
-                        error = True
-                        break
-
-                # Model Initialized
-                elif message[0] == CommunicationProtocol.MODEL_INITIALIZED:
-                    if self.__exec(CommunicationProtocol.MODEL_INITIALIZED, None, None):
-                        message = message[1:]
-                    else:
-                        error = True
-                        break
-
-                # Model Initialized
-                elif message[0] == CommunicationProtocol.TRANSFER_LEADERSHIP:
-                    if self.__exec(CommunicationProtocol.TRANSFER_LEADERSHIP, None, None):
-                        message = message[1:]
-                    else:
-                        error = True
-                        break
+        Args:
+            msg: The message to parse.
 
+        Yields:
+            tuple: (action, hash, cmd_text, args) hash and cmd_text are None for non gossiped messages. ``None`` if the rest of the message is not valid (last item).
+        """
+        # Determine if is a binary message or not
+        if msg.startswith(CommunicationProtocol.PARAMS_B):
+            # The block is framed by its length (the payload is handed over as a view, no copy of the block)
+            length, last = CommunicationProtocol.PARAMS_HEADER.unpack_from(msg, len(CommunicationProtocol.PARAMS_B))
+            start = CommunicationProtocol._PARAMS_LEN
+            yield CommunicationProtocol.PARAMS, None, None, (memoryview(msg)[start: start + length], bool(last))
+            return
+
+        # Process messages over the raw bytes: the header (first token) selects, with a single dict lookup, the pattern of the arguments and the method that parses them.
+        # Only the fields that callbacks use as text (node names, roles, hosts) are decoded.
+        # The scan runs in the C regex engine, the loop only does the dispatch (bound once).
+        next_header = CommunicationProtocol.__HEADER_RE.match
+        handlers = CommunicationProtocol.__HANDLERS
+        pos = 0
+        while True:
+            # Cursor over the buffer: bounds of the header, the arguments are matched just after it (no token list)
+            start, end = next_header(msg, pos).span(1)
+            if start == end:
+                # Only whitespace left
+                return
+            handler = handlers.get(msg[start:end])
+            if handler is None:
                 # Non Recognized message
-                else:
-                    error = True
-                    break
+                yield None
+                return
+            args, parse = handler
+            m = args(msg, end)
+            if m is None:
+                # Wrong arguments
+                yield None
+                return
+            try:
+                cmd = parse(msg, start, m)
+            except (UnicodeDecodeError, ValueError):
+                # Not decodable text or not numeric field (numbers are validated by its conversion)
+                yield None
+                return
+            yield cmd
+            pos = m.end()
+
+    @staticmethod
+    def __cmd_text(msg: bytes, start: int, end: int) -> bytes:
+        # Gossiped messages match their line break, so the text to gossip is usually a single slice of the buffer.
+        # Tokens can be separated by any whitespace: the text is normalized (single spaces) only if it is not already
+        text = msg[start:end]
+        if text[-1] != 10:  # b"\n"
+            text += b"\n"
+        if b"  " in text or b"\t" in text or text.count(b"\n") > 1 or b" \n" in text or b"\r" in text:
+            return b" ".join(text.split()) + b"\n"
+        return text
+
+    """
+    Parsers of the text messages (used through ``__HANDLERS``): arguments of the message -> command to execute.
+    """
+
+    def __parse_beat(msg: bytes, start: int, m: Match[bytes]) -> _Command:
+        return CommunicationProtocol.BEAT, m.group("beat_hash"), CommunicationProtocol.__cmd_text(msg, start, m.end()), (m.group("beat_node").decode("utf-8"),)
+
+    def __parse_role(msg: bytes, start: int, m: Match[bytes]) -> _Command:
+        return (
+            CommunicationProtocol.ROLE,
+            m.group("role_hash"),
+            CommunicationProtocol.__cmd_text(msg, start, m.end()),
+            (m.group("role_node").decode("utf-8"), m.group("role_role").decode("utf-8")),
+        )
+
+    def __parse_stop(msg: bytes, start: int, m: Match[bytes]) -> _Command:
+        return CommunicationProtocol.STOP, None, None, ()
+
+    def __parse_conn_to(msg: bytes, start: int, m: Match[bytes]) -> _Command:
+        return CommunicationProtocol.CONN_TO, None, None, (m.group("conn_to_host").decode("utf-8"), int(m.group("conn_to_port")))
+
+    def __parse_start_learning(msg: bytes, start: int, m: Match[bytes]) -> _Command:
+        return (
+            CommunicationProtocol.START_LEARNING,
+            m.group("start_learning_hash"),
+            CommunicationProtocol.__cmd_text(msg, start, m.end()),
+            (int(m.group("start_learning_rounds")), int(m.group("start_learning_epochs"))),
+        )
+
+    def __parse_stop_learning(msg: bytes, start: int, m: Match[bytes]) -> _Command:
+        return CommunicationProtocol.STOP_LEARNING, m.group("stop_learning_hash"), CommunicationProtocol.__cmd_text(msg, start, m.end()), ()
 
-            # Return
-            return self.tmp_exec_msgs, error
+    def __parse_models_ready(msg: bytes, start: int, m: Match[bytes]) -> _Command:
+        return CommunicationProtocol.MODELS_READY, None, None, (int(m.group("models_ready_round")),)
+
+    def __parse_metrics(msg: bytes, start: int, m: Match[bytes]) -> _Command:
+        return (
+            CommunicationProtocol.METRICS,
+            m.group("metrics_hash"),
+            CommunicationProtocol.__cmd_text(msg, start, m.end()),
+            (
+                m.group("metrics_node").decode("utf-8"),
+                int(m.group("metrics_round")),
+                float(m.group("metrics_loss")),
+                float(m.group("metrics_metric")),
+            ),
+        )
+
+    def __parse_vote_train_set(msg: bytes, start: int, m: Match[bytes]) -> _Command:
+        # Process vote message (<node> <punct> pairs, taken as strided slices and converted in C by map/zip)
+        vote_msg = m.group("vote_train_set_votes").split()
+        votes = zip(map(bytes.decode, vote_msg[0::2]), map(int, vote_msg[1::2]))
+        return (
+            CommunicationProtocol.VOTE_TRAIN_SET,
+            m.group("vote_train_set_hash"),
+            CommunicationProtocol.__cmd_text(msg, start, m.end()),
+            (m.group("vote_train_set_node").decode("utf-8"), dict(votes)),
+        )
+
+    def __parse_models_aggregated(msg: bytes, start: int, m: Match[bytes]) -> _Command:
+        nodes = m.group("models_aggregated_nodes").decode("utf-8").split()
+        logging.info("[COMM_PROTOCOL.MODELS_AGGREGATED] Received models_aggregated message with %s", nodes)
+        return CommunicationProtocol.MODELS_AGGREGATED, None, None, (nodes,)
+
+    def __parse_model_initialized(msg: bytes, start: int, m: Match[bytes]) -> _Command:
+        return CommunicationProtocol.MODEL_INITIALIZED, None, None, ()
+
+    def __parse_transfer_leadership(msg: bytes, start: int, m: Match[bytes]) -> _Command:
+        return CommunicationProtocol.TRANSFER_LEADERSHIP, None, None, ()
+
+    """
+    Text messages: header (first token of the message, empty if there are only whitespaces left).
+    """
+    __HEADER_RE = re.compile(rb"\s*(\S*)")
+
+    """
+    Header of the message -> (pattern of the arguments (matched just after the header), method that processes it).
+    The arguments are the inner groups of the pattern and a message has to end at a token boundary (gossiped messages also match their line break).
+    A single lookup with the header slice is cheaper than narrowing candidates by the first byte (``S`` and ``M`` have up to four headers, compared one by one in Python).
+    """
+    __HANDLERS = {
+        BEAT.encode("utf-8"): (re.compile(rb"\s+(?P<beat_node>\S+)\s+(?P<beat_hash>\S+)(?:\n|(?!\S))").match, __parse_beat),
+        ROLE.encode("utf-8"): (re.compile(rb"\s+(?P<role_node>\S+)\s+(?P<role_role>\S+)\s+(?P<role_hash>\S+)(?:\n|(?!\S))").match, __parse_role),
+        STOP.encode("utf-8"): (re.compile(rb"").match, __parse_stop),
+        CONN_TO.encode("utf-8"): (re.compile(rb"\s+(?P<conn_to_host>\S+)\s+(?P<conn_to_port>\S+)(?!\S)").match, __parse_conn_to),
+        START_LEARNING.encode("utf-8"): (
+            re.compile(rb"\s+(?P<start_learning_rounds>\S+)\s+(?P<start_learning_epochs>\S+)\s+(?P<start_learning_hash>\S+)(?:\n|(?!\S))").match,
+            __parse_start_learning,
+        ),
+        STOP_LEARNING.encode("utf-8"): (re.compile(rb"\s+(?P<stop_learning_hash>\S+)(?:\n|(?!\S))").match, __parse_stop_learning),
+        MODELS_READY.encode("utf-8"): (re.compile(rb"\s+(?P<models_ready_round>\S+)(?!\S)").match, __parse_models_ready),
+        METRICS.encode("utf-8"): (
+            re.compile(rb"\s+(?P<metrics_node>\S+)\s+(?P<metrics_round>\S+)\s+(?P<metrics_loss>\S+)\s+(?P<metrics_metric>\S+)\s+(?P<metrics_hash>\S+)(?:\n|(?!\S))").match,
+            __parse_metrics,
+        ),
+        VOTE_TRAIN_SET.encode("utf-8"): (
+            functools.partial(_match_counted, _VOTE_TRAIN_SET_COUNT_RE, _vote_train_set_re),
+            __parse_vote_train_set,
+        ),
+        MODELS_AGGREGATED.encode("utf-8"): (
+            functools.partial(_match_counted, _MODELS_AGGREGATED_COUNT_RE, _models_aggregated_re),
+            __parse_models_aggregated,
+        ),
+        MODEL_INITIALIZED.encode("utf-8"): (re.compile(rb"").match, __parse_model_initialized),
+        TRANSFER_LEADERSHIP.encode("utf-8"): (re.compile(rb"").match, __parse_transfer_leadership),
+    }
 
     # Exec callbacks
-    def __exec(self, action, hash_, cmd_text, *args):
+    def __exec(self, action: str, hash_: Optional[bytes], cmd_text: Optional[bytes], args: Tuple[Any, ...]) -> bool:
         try:
-            # Check if you can be executed
-            if hash_ not in self.last_messages or hash_ is None:
+            # Check if you can be executed (the hash is checked and saved at once)
+            if hash_ is None:
+                self.command_dict[action].execute(*args)
+            elif self.last_messages.add(hash_):
                 self.command_dict[action].execute(*args)
                 # Save to gossip
-                if hash_ is not None:
-                    self.tmp_exec_msgs[hash_] = cmd_text
-                    self.add_processed_messages([hash_])
-                return True
+                self.tmp_exec_msgs[hash_] = cmd_text
             return True
         except Exception as e:
             logging.info("Error executing callback: " + str(e))
@@ -468,7 +419,7 @@ class CommunicationProtocol:
     #    MSG PROCESSING (Static Methods)   #
     ########################################
     @staticmethod
-    def process_connection(message, callback):
+    def process_connection(message: str, callback: Callable[..., Any]) -> bool:
         """
         Static method that checks if the message is a valid connection message and executes the callback (accept connection).
 
@@ -495,7 +446,33 @@ class CommunicationProtocol:
             return False
 
     @staticmethod
-    def check_collapse(msg):
+    def process_connection_bytes(message: bytes, node_socket: Any, callback: Callable[..., Any]) -> bool:
+        """
+        Same as ``process_connection`` but working directly over the received bytes (no decoding needed). The callback receives the socket of the new connection as first argument, so it can be bound once instead of per connection.
+
+        Args:
+            message: The message to check (bytes-like object).
+            node_socket: The socket of the new connection.
+            callback: What do if the connection message is legit.
+
+        Returns:
+            True if connection was accepted, False otherwise.
+        """
+        # CONNECT <ip> <port> <full> <force>: fixed number of fields, unpacked directly (only the first line is the handshake)
+        try:
+            header, h, p, full, force = bytes(message).split(b"\n", 1)[0].split(None, 4)
+        except ValueError:
+            return False
+        if header != CommunicationProtocol.CONN_B:
+            return False
+        try:
+            callback(node_socket, h.decode("utf-8"), int(p), full == b"1", force.rstrip() == b"1")
+            return True
+        except Exception as e:
+            return False
+
+    @staticmethod
+    def check_collapse(msg: bytes) -> int:
         """
         Static method that checks if in the message there is a collapse (a binary message (it should fill all the buffer) and a non-binary message before it).
 
@@ -507,33 +484,47 @@ class CommunicationProtocol:
         Returns:
             Length of the collapse (number of bytes to the binary headear).
         """
-        header = CommunicationProtocol.PARAMS.encode("utf-8")
-        header_pos = msg.find(header)
-        if header_pos != -1 and msg[0: len(header)] != header:
+        header_pos = msg.find(CommunicationProtocol.PARAMS_B)
+        if header_pos > 0:
             return header_pos
 
         return 0
 
     @staticmethod
-    def check_params_incomplete(msg, block_size):
+    def check_params_incomplete(msg: bytes, block_size: Optional[int] = None) -> int:
         """
         Checks if a params message is incomplete. If the message is complete or is not a params message, it returns 0.
+        Blocks are framed by its length, so it only needs the header of the block (no scan of the data).
+
+        Args:
+            msg: The message to check.
+            block_size: Unused (blocks are not padded to the block size). Kept for compatibility.
 
         Returns:
-            Number of bytes that needs to be complete
+            Number of bytes that needs to be complete (if the header is not complete, the bytes to complete the header)
         """
-        header = CommunicationProtocol.PARAMS.encode("utf-8")
-        if msg[0: len(header)] == header:
-            if len(msg) < block_size:
-                return block_size - len(msg)
+        if msg.startswith(CommunicationProtocol.PARAMS_B):
+            if len(msg) < CommunicationProtocol._PARAMS_LEN:
+                return CommunicationProtocol._PARAMS_LEN - len(msg)
+            missing = CommunicationProtocol.get_params_msg_len(msg) - len(msg)
+            if missing > 0:
+                return missing
 
         return 0
 
+    @staticmethod
+    def get_params_msg_len(msg: bytes) -> int:
+        """
+        Returns:
+            Length of the params message at the start of ``msg`` (header included). The header has to be complete.
+        """
+        return CommunicationProtocol._PARAMS_LEN + CommunicationProtocol.PARAMS_HEADER.unpack_from(msg, len(CommunicationProtocol.PARAMS_B))[0]
+
     #######################################
     #     MSG BUILDERS (Static Methods)   #
     #######################################
     @staticmethod
-    def generate_hased_message(msg):
+    def generate_hased_message(msg: str) -> bytes:
         """
         Static method that given a non-encoded message generates a hashed and encoded message.
 
@@ -543,46 +534,41 @@ class CommunicationProtocol:
         Returns:
             Hashed and encoded message.
         """
-        # random number to avoid generating the same hash for a different message (at she same time)
-        id = hash(msg + str(datetime.now()) + str(random.randint(0, 100000)))
-        return (msg + " " + str(id) + "\n").encode("utf-8")
+        # Prefix (random per process) + sequence number, so two messages never share the id
+        return f"{msg} {CommunicationProtocol._node_prefix}{next(CommunicationProtocol._msg_seq):x}\n".encode("utf-8")
 
     @staticmethod
-    def build_beat_msg(node):
+    def build_beat_msg(node: str) -> bytes:
         """
         Static method that builds a beat message.
         CommunicationProtocol.BEAT + node
         Returns:
             An encoded beat message.
         """
-        logging.debug("[COMM_PROTOCOL.build_beat_msg] Sending beat message: {}".format(CommunicationProtocol.BEAT + " " + node))
-        return CommunicationProtocol.generate_hased_message(
-            CommunicationProtocol.BEAT + " " + node
-        )
+        logging.debug("[COMM_PROTOCOL.build_beat_msg] Sending beat message: %s %s", CommunicationProtocol.BEAT, node)
+        return CommunicationProtocol.generate_hased_message(f"{CommunicationProtocol.BEAT} {node}")
 
     @staticmethod
-    def build_role_msg(node, role):
+    def build_role_msg(node: str, role: str) -> bytes:
         """
         Static method that builds a role message.
         CommunicationProtocol.ROLE + node + role
         Returns:
             An encoded role message.
         """
-        logging.debug("[COMM_PROTOCOL.build_role_msg] Sending role message: {}".format(CommunicationProtocol.ROLE + " " + node + " " + role))
-        return CommunicationProtocol.generate_hased_message(
-            CommunicationProtocol.ROLE + " " + node + " " + role
-        )
+        logging.debug("[COMM_PROTOCOL.build_role_msg] Sending role message: %s %s %s", CommunicationProtocol.ROLE, node, role)
+        return CommunicationProtocol.generate_hased_message(f"{CommunicationProtocol.ROLE} {node} {role}")
 
     @staticmethod
-    def build_stop_msg():
+    def build_stop_msg() -> bytes:
         """
         Returns:
             An encoded stop message.
         """
-        return (CommunicationProtocol.STOP + "\n").encode("utf-8")
+        return f"{CommunicationProtocol.STOP}\n".encode("utf-8")
 
     @staticmethod
-    def build_connect_to_msg(ip, port):
+    def build_connect_to_msg(ip: str, port: int) -> bytes:
         """
         Args:
             ip: The ip address to connect to.
@@ -591,12 +577,10 @@ class CommunicationProtocol:
         Returns:
             An encoded connect to message.
         """
-        return (
-                CommunicationProtocol.CONN_TO + " " + ip + " " + str(port) + "\n"
-        ).encode("utf-8")
+        return f"{CommunicationProtocol.CONN_TO} {ip} {port}\n".encode("utf-8")
 
     @staticmethod
-    def build_start_learning_msg(rounds, epochs):
+    def build_start_learning_msg(rounds: int, epochs: int) -> bytes:
         """
         Args:
             rounds: The number of rounds to train.
@@ -606,11 +590,11 @@ class CommunicationProtocol:
             An encoded start learning message.
         """
         return CommunicationProtocol.generate_hased_message(
-            CommunicationProtocol.START_LEARNING + " " + str(rounds) + " " + str(epochs)
+            f"{CommunicationProtocol.START_LEARNING} {rounds} {epochs}"
         )
 
     @staticmethod
-    def build_stop_learning_msg():
+    def build_stop_learning_msg() -> bytes:
         """
         Returns:
             An encoded stop learning message.
@@ -620,7 +604,7 @@ class CommunicationProtocol:
         )
 
     @staticmethod
-    def build_models_ready_msg(round):
+    def build_models_ready_msg(round: int) -> bytes:
         """
         Args:
             round: The last round finished.
@@ -628,12 +612,10 @@ class CommunicationProtocol:
         Returns:
             An encoded ready message.
         """
-        return (CommunicationProtocol.MODELS_READY + " " + str(round) + "\n").encode(
-            "utf-8"
-        )
+        return f"{CommunicationProtocol.MODELS_READY} {round}\n".encode("utf-8")
 
     @staticmethod
-    def build_metrics_msg(node, round, loss, metric):
+    def build_metrics_msg(node: str, round: int, loss: float, metric: float) -> bytes:
         """
         Args:
             node: The node that sent the message.
@@ -645,19 +627,11 @@ class CommunicationProtocol:
             An encoded metrics message.
         """
         return CommunicationProtocol.generate_hased_message(
-            CommunicationProtocol.METRICS
-            + " "
-            + node
-            + " "
-            + str(round)
-            + " "
-            + str(loss)
-            + " "
-            + str(metric)
+            f"{CommunicationProtocol.METRICS} {node} {round} {loss} {metric}"
         )
 
     @staticmethod
-    def build_vote_train_set_msg(node, votes):
+    def build_vote_train_set_msg(node: str, votes: List[Tuple[str, int]]) -> bytes:
         """
         Args:
             node: The node that sent the message.
@@ -666,20 +640,13 @@ class CommunicationProtocol:
         Returns:
             An encoded vote train set message.
         """
-        aux = ""
-        for v in votes:
-            aux = aux + " " + v[0] + " " + str(v[1])
-        return CommunicationProtocol.generate_hased_message(
-            CommunicationProtocol.VOTE_TRAIN_SET
-            + " "
-            + node
-            + aux
-            + " "
-            + CommunicationProtocol.VOTE_TRAIN_SET_CLOSE
-        )
+        parts = [CommunicationProtocol.VOTE_TRAIN_SET, node, None]
+        parts.extend(f"{v[0]} {v[1]}" for v in votes)
+        parts[2] = str(len(parts) - 3)
+        return CommunicationProtocol.generate_hased_message(" ".join(parts))
 
     @staticmethod
-    def build_models_aggregated_msg(nodes):
+    def build_models_aggregated_msg(nodes: List[str]) -> bytes:
         """
         Args:
             nodes: List of strings to indicate aggregated nodes.
@@ -687,27 +654,20 @@ class CommunicationProtocol:
         Returns:
             An encoded models aggregated message.
         """
-        aux = ""
-        for n in nodes:
-            aux = aux + " " + n
         return (
-                CommunicationProtocol.MODELS_AGGREGATED
-                + aux
-                + " "
-                + CommunicationProtocol.MODELS_AGGREGATED_CLOSE
-                + "\n"
+            " ".join([CommunicationProtocol.MODELS_AGGREGATED, str(len(nodes)), *nodes]) + "\n"
         ).encode("utf-8")
 
     @staticmethod
-    def build_model_initialized_msg():
+    def build_model_initialized_msg() -> bytes:
         """
         Returns:
             An encoded model inicialized message.
         """
-        return (CommunicationProtocol.MODEL_INITIALIZED + "\n").encode("utf-8")
+        return f"{CommunicationProtocol.MODEL_INITIALIZED}\n".encode("utf-8")
 
     @staticmethod
-    def build_connect_msg(ip, port, broadcast, force):
+    def build_connect_msg(ip: str, port: int, broadcast: str, force: str) -> bytes:
         """
         Build Handshake message.
         Not Hashed. Special case of message.
@@ -721,57 +681,44 @@ class CommunicationProtocol:
         Returns:
             An encoded connect message.
         """
-        return (
-                CommunicationProtocol.CONN
-                + " "
-                + ip
-                + " "
-                + str(port)
-                + " "
-                + str(broadcast)
-                + " "
-                + str(force)
-                + "\n"
-        ).encode("utf-8")
+        return f"{CommunicationProtocol.CONN} {ip} {port} {broadcast} {force}\n".encode("utf-8")
 
     @staticmethod
-    def build_params_msg(data, block_size):
+    def build_params_msg(data: bytes, block_size: int) -> List[bytearray]:
         """
         Build model serialized messages.
         Not Hashed. Special case of message (binary message).
 
         Args:
-            block_size:
+            block_size: Maximum size of each block (header included).
             data: The model parameters to send (encoded).
 
         Returns:
-            A list of fragments messages of the params.
+            A list of fragments messages of the params (``bytearray`` blocks of up to ``block_size`` bytes, the last one is flagged).
         """
-        # Encoding Headers and ending
-        header = CommunicationProtocol.PARAMS.encode("utf-8")
-        end = CommunicationProtocol.PARAMS_CLOSE.encode("utf-8")
+        # Each block is framed by the length of its data (no closing message nor padding)
+        header = CommunicationProtocol.PARAMS_B
+        framing = CommunicationProtocol.PARAMS_HEADER
+        header_len = CommunicationProtocol._PARAMS_LEN
 
-        # Spliting data
-        size = block_size - len(header)
+        # Spliting data: each block is allocated once and filled by slice assignment
+        data = memoryview(data)
+        size = block_size - header_len
         data_msgs = []
-        for i in range(0, len(data), size):
-            data_msgs.append(header + (data[i: i + size]))
-
-        # Adding closing message
-        if len(data_msgs[-1]) + len(end) <= block_size:
-            data_msgs[-1] += end
-            data_msgs[-1] += b"\0" * (
-                    block_size - len(data_msgs[-1])
-            )  # padding to avoid message fragmentation
-        else:
-            data_msgs.append(header + end)
+        for i in range(0, max(len(data), 1), size):
+            chunk = data[i: i + size]
+            block = bytearray(header_len + len(chunk))
+            block[: len(header)] = header
+            framing.pack_into(block, len(header), len(chunk), i + size >= len(data))
+            block[header_len:] = chunk
+            data_msgs.append(block)
 
         return data_msgs
 
     @staticmethod
-    def build_transfer_leadership_msg():
+    def build_transfer_leadership_msg() -> bytes:
         """
         Returns:
             An encoded leadership transfer message.
         """
-        return (CommunicationProtocol.TRANSFER_LEADERSHIP + "\n").encode("utf-8")
+        return f"{CommunicationProtocol.TRANSFER_LEADERSHIP}\n".encode("utf-8")
@@ -9,7 +9,66 @@ Module to define constants for the DFL system.
 """
 import json
 import logging
-from fedstellar.encrypter import AESCipher
+import mmap
+import os
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Files from this size are memory-mapped to be parsed (no copy of the content in a bytes object)
+_MMAP_THRESHOLD = 1 << 20
+
+
+def _parse_json_file(path):
+    """
+    Parses a JSON file. ``orjson`` is used if it is available (faster parsing), stdlib ``json`` otherwise.
+    """
+    if orjson is not None:
+        with open(path, "rb") as json_file:
+            if os.fstat(json_file.fileno()).st_size >= _MMAP_THRESHOLD:
+                with mmap.mmap(json_file.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+                    return orjson.loads(view)
+            return orjson.loads(json_file.read())
+    with open(path) as json_file:
+        return json.load(json_file)
+
+
+# Parse cache: path -> (st_mtime_ns, st_size, pickled content). Content is kept pickled so every hit returns new objects (callers modify them).
+# It lives only in the memory of the process, so concurrent loads (ThreadPoolExecutor) never write a shared file and no pickle is read from disk
+_parse_cache = {}
+
+
+def _load_json_file(path):
+    """
+    Loads a JSON file. Parsed files are cached in memory and reused while their modification time and size do not change.
+    """
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    entry = _parse_cache.get(path)
+    if entry is not None and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+        return pickle.loads(entry[2])
+
+    data = _parse_json_file(path)
+    _parse_cache[path] = (st.st_mtime_ns, st.st_size, pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL))
+    return data
+
+
+def _save_json_file(path, data):
+    """
+    Saves a JSON file (indented with 2 spaces, ending with a newline). ``orjson`` is used if it is available (faster serialization, bytes written directly), stdlib ``json`` otherwise.
+    """
+    if orjson is not None:
+        with open(path, "wb") as json_file:
+            json_file.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE))
+        return
+    with open(path, "w") as json_file:
+        json.dump(data, json_file, sort_keys=False, indent=2)
+        json_file.write("\n")
 
 
 ###################
@@ -66,44 +125,39 @@ class Config:
 
     # Read the configuration file scenario_config.json, and return a dictionary with the configuration
     def set_participant_config(self, participant_config):
-        with open(participant_config) as json_file:
-            self.participant = json.load(json_file)
+        self.participant = _load_json_file(participant_config)
 
     def set_topology_config(self, topology_config_file):
-        with open(topology_config_file) as json_file:
-            self.topology = json.load(json_file)
+        self.topology = _load_json_file(topology_config_file)
 
     def add_participant_config(self, participant_config):
-        with open(participant_config) as json_file:
-            self.participants.append(json.load(json_file))
+        self.participants.append(_load_json_file(participant_config))
 
     def set_participants_config(self, participants_config):
-        self.participants = []
         self.participants_path = participants_config
-        for participant in participants_config:
-            self.add_participant_config(participant)
+        # Files are read in parallel (file I/O releases the GIL), in the same order
+        with ThreadPoolExecutor(max_workers=min(32, max(1, len(participants_config)))) as executor:
+            self.participants = list(executor.map(_load_json_file, participants_config))
 
     def __adjust_block_size(self):
+        from fedstellar.encrypter import AESCipher  # only needed here, avoids loading the crypto backend with the config
+
         if self.entity == "participant":
-            rest = self.participant['BLOCK_SIZE'] % AESCipher.get_block_size()
-            if rest != 0:
-                new_value = self.participant['BLOCK_SIZE'] + AESCipher.get_block_size() - rest
+            targets = [self.participant]
+        elif self.entity == "controller":
+            targets = self.participants
+        else:
+            raise Exception("Entity not supported")
+
+        # Round up to a multiple of the AES block size (read once for all the targets; not a module constant so the crypto backend is only imported here)
+        aes_block_size = AESCipher.get_block_size()
+        for participant in targets:
+            block_size = participant['BLOCK_SIZE']
+            new_value = -(-block_size // aes_block_size) * aes_block_size
+            if new_value != block_size:
                 logging.info(
                     "[SETTINGS] Changing buffer size to %d. %d is incompatible with the AES block size.",
-                    self.participant['BLOCK_SIZE'],
                     new_value,
+                    block_size,
                 )
-                self.participant['BLOCK_SIZE'] = new_value
-        elif self.entity == "controller":
-            for participant in self.participants:
-                rest = participant['BLOCK_SIZE'] % AESCipher.get_block_size()
-                if rest != 0:
-                    new_value = participant['BLOCK_SIZE'] + AESCipher.get_block_size() - rest
-                    logging.info(
-                        "[SETTINGS] Changing buffer size to %d. %d is incompatible with the AES block size.",
-                        participant['BLOCK_SIZE'],
-                        new_value,
-                    )
-                    participant['BLOCK_SIZE'] = new_value
-        else:
-            raise Exception("Entity not supported")
+                participant['BLOCK_SIZE'] = new_value
@@ -1,6 +1,4 @@
-import glob
 import hashlib
-import json
 import logging
 import os
 import re
@@ -8,18 +6,35 @@ import signal
 import subprocess
 import sys
 import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+import psutil
 from dotenv import load_dotenv
 
-from fedstellar.config.config import Config
+from fedstellar.config.config import Config, _save_json_file
 from fedstellar.config.mender import Mender
 from fedstellar.utils.topologymanager import TopologyManager
 
 os.environ["PYTORCH_ENABLE_MPS_FALLBACK"] = "1"
 
+# Directories of the module (resolved once)
+_MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+_PARENT_DIR = os.path.dirname(_MODULE_DIR)
+_MODULE_REAL_DIR = os.path.dirname(os.path.realpath(__file__))  # symbolic links resolved (node_start.py)
+
+# Addresses of the local ports to free (killports)
+_LOCALHOST = ("127.0.0.1", "::1")
+
+# The uid of the nodes is not a security digest (usedforsecurity is only available since Python 3.9)
+_SHA1_KWARGS = {"usedforsecurity": False} if sys.version_info >= (3, 9) else {}
+
 
 # Setup controller logger
+_ESCAPE_RE = re.compile(r'\x1b\[[0-9;]*m')
+
+
 class TermEscapeCodeFormatter(logging.Formatter):
     """A class to strip the escape codes from the """
 
@@ -27,8 +42,9 @@ class TermEscapeCodeFormatter(logging.Formatter):
         super().__init__(fmt, datefmt, style, validate)
 
     def format(self, record):
-        escape_re = re.compile(r'\x1b\[[0-9;]*m')
-        record.msg = re.sub(escape_re, "", str(record.msg))
+        msg = str(record.msg)
+        # Most of the messages have no escape codes (no regex scan)
+        record.msg = _ESCAPE_RE.sub("", msg) if "\x1b" in msg else msg
         return super().format(record)
 
 
@@ -119,7 +135,7 @@ class Controller:
 
         # Save the configuration in environment variables
         logging.info("Saving configuration in environment variables...")
-        os.environ["FEDSTELLAR_ROOT"] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        os.environ["FEDSTELLAR_ROOT"] = _PARENT_DIR
         os.environ["FEDSTELLAR_LOGS_DIR"] = self.log_dir
         os.environ["FEDSTELLAR_CONFIG_DIR"] = self.config_dir
         os.environ["FEDSTELLAR_PYTHON_PATH"] = self.python_path
@@ -153,8 +169,14 @@ class Controller:
             sys.exit(0)
 
         logging.info('Press Ctrl+C for exit from Fedstellar (global exit)')
-        while True:
-            time.sleep(1)
+        if hasattr(signal, "pause"):
+            # Block in the kernel until a signal arrives (SIGINT is handled by signal_handler)
+            while True:
+                signal.pause()
+        else:
+            # Windows has no signal.pause() and a blocking wait there is not interrupted by Ctrl+C
+            while True:
+                time.sleep(1)
 
     def run_webserver(self):
         if sys.platform == "linux" and self.cloud:
@@ -167,8 +189,7 @@ class Controller:
 
             logging.info(f"Running Fedstellar Webserver (cloud): http://127.0.0.1:{self.webserver_port}")
             controller_env = os.environ.copy()
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            webserver_path = os.path.join(current_dir, "webserver")
+            webserver_path = os.path.join(_MODULE_DIR, "webserver")
             with open(f'{self.log_dir}/server.log', 'w', encoding='utf-8') as log_file:
                 # Remove option --reload for production
                 subprocess.Popen(["gunicorn", "--workers", "4", "--threads", "4", "--bind", f"unix:/tmp/fedstellar.sock", "--access-logfile", f"{self.log_dir}/server.log", "app:app"], cwd=webserver_path, env=controller_env, stdout=log_file, stderr=log_file, encoding='utf-8')
@@ -176,8 +197,7 @@ class Controller:
         else:
             logging.info(f"Running Fedstellar Webserver (local): http://127.0.0.1:{self.webserver_port}")
             controller_env = os.environ.copy()
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            webserver_path = os.path.join(current_dir, "webserver")
+            webserver_path = os.path.join(_MODULE_DIR, "webserver")
             with open(f'{self.log_dir}/server.log', 'w', encoding='utf-8') as log_file:
                 subprocess.Popen([self.python_path, "app.py", "--port", str(self.webserver_port)], cwd=webserver_path, env=controller_env, stdout=log_file, stderr=log_file, encoding='utf-8')
 
@@ -190,57 +210,87 @@ class Controller:
         # Get the tensorboard path
         tensorboard_path = os.path.dirname(tensorboard.__file__)
         # Include "index.html" in a zip file "webfiles.zip" which is in the tensorboard root folder. If the file "index.html" exists in the zip, it will be overwritten.
-        with zipfile.ZipFile(os.path.join(tensorboard_path, "webfiles.zip"), "a") as zip:
-            zip.write(os.path.join(os.path.dirname(os.path.abspath(__file__)), "webserver", "config", "statistics", "index.html"), "index.html")
-            zip.write(os.path.join(os.path.dirname(os.path.abspath(__file__)), "webserver", "config", "statistics", "index.js"), "index.js")
+        # Files already up to date (same CRC) are not appended again, so the zip does not grow with duplicated entries on every start
+        webfiles_path = os.path.join(tensorboard_path, "webfiles.zip")
+        statistics_path = os.path.join(_MODULE_DIR, "webserver", "config", "statistics")
+        webfiles = {}
+        for name in ("index.html", "index.js"):
+            with open(os.path.join(statistics_path, name), "rb") as f:
+                webfiles[name] = f.read()
+        try:
+            with zipfile.ZipFile(webfiles_path, "r") as zip:
+                current = {info.filename: info.CRC for info in zip.infolist()}  # The last entry of a name is the one used
+        except (FileNotFoundError, zipfile.BadZipFile):
+            current = {}
+        outdated = [name for name, data in webfiles.items() if current.get(name) != zlib.crc32(data)]
+        if outdated:
+            with zipfile.ZipFile(webfiles_path, "a") as zip:
+                for name in outdated:
+                    zip.writestr(name, webfiles[name])
 
         logging.info(f"Running Fedstellar Statistics")
         controller_env = os.environ.copy()
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        webserver_path = os.path.join(current_dir, "webserver")
+        webserver_path = os.path.join(_MODULE_DIR, "webserver")
         with open(f'{self.log_dir}/statistics_server.log', 'w', encoding='utf-8') as log_file:
             subprocess.Popen(["tensorboard", "--host", "0.0.0.0", "--port", str(self.statistics_port), "--logdir", self.log_dir, "--reload_interval", "1", "--window_title", "Fedstellar Statistics"], cwd=webserver_path, env=controller_env, stdout=log_file, stderr=log_file, encoding='utf-8')
 
     @staticmethod
     def killports(term="python"):
         # kill all the ports related to python processes
-        time.sleep(1)
         # Remove process related to tensorboard
-
-        if sys.platform == "darwin":
-            command = '''kill -9 $(lsof -i @localhost:1024-65545 | grep ''' + term + ''' | awk '{print $2}') > /dev/null 2>&1'''
-        elif sys.platform == "linux":
-            command = '''kill -9 $(lsof -i @localhost:1024-65545 | grep ''' + term + ''' | awk '{print $2}') > /dev/null 2>&1'''
-        else:
-            command = '''taskkill /F /IM ''' + term + '''.exe > nul 2>&1'''
-
-        os.system(command)
+        Controller._kill_processes(term, lambda addr: addr.ip in _LOCALHOST and 1024 <= addr.port <= 65535)
 
     @staticmethod
     def killport(port):
-        time.sleep(1)
-        if sys.platform == "darwin":
-            command = '''kill -9 $(lsof -i @localhost:''' + str(port) + ''' | grep python | awk '{print $2}') > /dev/null 2>&1'''
-        elif sys.platform == "linux":
-            command = '''kill -9 $(lsof -i :''' + str(port) + ''' | grep python | awk '{print $2}') > /dev/null 2>&1'''
-        elif sys.platform == "win32":
-            command = 'taskkill /F /PID $(FOR /F "tokens=5" %P IN (\'netstat -a -n -o ^| findstr :' + str(port) + '\') DO echo %P)'
-        else:
-            raise ValueError("Unknown platform")
+        port = int(port)
+        Controller._kill_processes("python", lambda addr: addr.port == port)
 
-        os.system(command)
+    @staticmethod
+    def _kill_processes(term, addr_filter):
+        """
+        Kill the processes whose name contains ``term`` and have a connection with an address (local or remote) accepted by ``addr_filter``.
+        The connections are read per process (``psutil.net_connections`` needs privileges on macOS), only for the processes matching the name.
+        If no process matches the name, it returns immediately (without the settle delay).
+        Processes are stopped with SIGTERM (nodes write their pending logs) and killed if they are still alive after 5 seconds.
+        """
+        pid = os.getpid()
+        procs = [proc for proc in psutil.process_iter(["name"]) if proc.pid != pid and term in (proc.info["name"] or "")]
+        if not procs:
+            return
+        time.sleep(1)
+        terminated = []
+        for proc in procs:
+            try:
+                for conn in proc.connections(kind="inet"):
+                    if any(addr and addr_filter(addr) for addr in (conn.laddr, conn.raddr)):
+                        proc.terminate()
+                        terminated.append(proc)
+                        break
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        _, alive = psutil.wait_procs(terminated, timeout=5)
+        for proc in alive:
+            try:
+                proc.kill()
+            except psutil.NoSuchProcess:
+                pass
 
     @staticmethod
     def killdockers():
         try:
             # kill all the docker containers which contain the word "fedstellar"
-            command = '''docker kill $(docker ps -q --filter ancestor=fedstellar) > /dev/null 2>&1'''
-            time.sleep(1)
-            os.system(command)
+            containers = subprocess.run(["docker", "ps", "-q", "--filter", "ancestor=fedstellar"], capture_output=True, text=True).stdout.split()
+            if containers:
+                subprocess.run(["docker", "kill", *containers], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                # Give the killed containers time to leave their networks
+                time.sleep(1)
             # remove all docker networks which contain the word "fedstellar"
-            command = '''docker network rm $(docker network ls | grep fedstellar | awk '{print $1}') > /dev/null 2>&1'''
-            time.sleep(1)
-            os.system(command)
+            networks = subprocess.run(["docker", "network", "ls", "-q", "--filter", "name=fedstellar"], capture_output=True, text=True).stdout.split()
+            if networks:
+                subprocess.run(["docker", "network", "rm", *networks], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except FileNotFoundError:
+            # Docker is not installed, nothing to kill
+            pass
         except Exception as e:
             raise Exception("Error while killing docker containers: {}".format(e))
 
@@ -258,8 +308,13 @@ class Controller:
         # Get participants configurations
         print("Loading participants configurations...")
         print(self.config_dir)
-        participant_files = glob.glob('{}/participant_*.json'.format(self.config_dir))
-        participant_files.sort()
+        # Ordered by index (participant_<i>.json, natural order), the configurations are updated by position
+        participant_files = sorted(
+            (int(entry.name[len("participant_"):-len(".json")]), entry.path)
+            for entry in os.scandir(self.config_dir)
+            if entry.name.startswith("participant_") and entry.name.endswith(".json") and entry.name[len("participant_"):-len(".json")].isdigit()
+        )
+        participant_files = [path for _, path in participant_files]
         if len(participant_files) == 0:
             raise ValueError("No participant files found in config folder")
 
@@ -271,16 +326,19 @@ class Controller:
 
         # Update participants configuration
         is_start_node, idx_start_node = False, 0
+        scenario_bytes = str(self.scenario_name).encode()
         for i in range(self.n_nodes):
-            with open(f'{self.config_dir}/participant_' + str(i) + '.json') as f:
-                participant_config = json.load(f)
+            # Already loaded by set_participants_config, updated in place
+            participant_config = self.config.participants[i]
             participant_config['scenario_args']["federation"] = self.federation
             participant_config['scenario_args']['n_nodes'] = self.n_nodes
             participant_config['network_args']['neighbors'] = self.topologymanager.get_neighbors_string(i)
             participant_config['scenario_args']['name'] = self.scenario_name
             participant_config['scenario_args']['start_time'] = self.start_date_scenario
             participant_config['device_args']['idx'] = i
-            participant_config['device_args']['uid'] = hashlib.sha1((str(participant_config["network_args"]["ip"]) + str(participant_config["network_args"]["port"]) + str(self.scenario_name)).encode()).hexdigest()
+            uid = hashlib.sha1(f'{participant_config["network_args"]["ip"]}{participant_config["network_args"]["port"]}'.encode(), **_SHA1_KWARGS)
+            uid.update(scenario_bytes)
+            participant_config['device_args']['uid'] = uid.hexdigest()
             participant_config['geo_args']['latitude'], participant_config['geo_args']['longitude'] = TopologyManager.get_coordinates(random_geo=True)
 
             participant_config['tracking_args']['log_dir'] = self.log_dir
@@ -291,11 +349,9 @@ class Controller:
                     idx_start_node = i
                 else:
                     raise ValueError("Only one node can be start node")
-            with open(f'{self.config_dir}/participant_' + str(i) + '.json', 'w') as f:
-                json.dump(participant_config, f, sort_keys=False, indent=2)
+            _save_json_file(participant_files[i], participant_config)
         if not is_start_node:
             raise ValueError("No start node found")
-        self.config.set_participants_config(participant_files)
 
         # Add role to the topology (visualization purposes)
         self.topologymanager.update_nodes(self.config.participants)
@@ -337,9 +393,8 @@ class Controller:
             raise ValueError("Unknown topology type: {}".format(self.topology))
 
         # Assign nodes to topology
-        nodes_ip_port = []
-        for i, node in enumerate(self.config.participants):
-            nodes_ip_port.append((node['network_args']['ip'], node['network_args']['port'], "undefined", node['network_args']['ipdemo']))
+        network_args = [node['network_args'] for node in self.config.participants]
+        nodes_ip_port = [(args['ip'], args['port'], "undefined", args['ipdemo']) for args in network_args]
 
         topologymanager.add_nodes(nodes_ip_port)
         return topologymanager
@@ -402,49 +457,47 @@ class Controller:
         """
 
         # Generate the Docker Compose file dynamically
-        services = ""
+        # Loop invariants (bound format methods, root path) are resolved once instead of once per node
+        format_participant = participant_template.format
+        format_participant_start = participant_template_start.format
+        fedstellar_root = os.environ["FEDSTELLAR_ROOT"]
+        network_gateway = self.network_gateway
+        container_config_dir = f"/fedstellar/app/config/{self.scenario_name}"
+        container_config_path = (container_config_dir + "/participant_{}.json").format
+        services = []
         self.config.participants.sort(key=lambda x: x['device_args']['idx'])
         for node in self.config.participants:
             idx = node['device_args']['idx']
-            path = f"/fedstellar/app/config/{self.scenario_name}/participant_{idx}.json"
+            path = container_config_path(idx)
             logging.info("Starting node {} with configuration {}".format(idx, path))
             logging.info("Node {} is listening on ip {}".format(idx, node['network_args']['ip']))
+            image = "fedstellar" if node['device_args']['accelerator'] == "cpu" else "fedstellar-gpu"
             # Add one service for each participant
             if idx != idx_start_node:
-                services += participant_template.format(idx,
-                                                        "fedstellar" if node['device_args']['accelerator'] == "cpu" else "fedstellar-gpu",
-                                                        os.environ["FEDSTELLAR_ROOT"],
-                                                        self.network_gateway,
-                                                        path,
-                                                        idx_start_node,
-                                                        node['network_args']['ip'])
+                services.append(format_participant(idx, image, fedstellar_root, network_gateway, path, idx_start_node, node['network_args']['ip']))
             else:
-                services += participant_template_start.format(idx,
-                                                              "fedstellar" if node['device_args']['accelerator'] == "cpu" else "fedstellar-gpu",
-                                                              os.environ["FEDSTELLAR_ROOT"],
-                                                              self.network_gateway,
-                                                              path,
-                                                              node['network_args']['ip'])
-        docker_compose_file = docker_compose_template.format(services)
-        docker_compose_file += network_template.format(self.network_subnet, self.network_gateway)
+                services.append(format_participant_start(idx, image, fedstellar_root, network_gateway, path, node['network_args']['ip']))
+        docker_compose_file = docker_compose_template.format("".join(services)) + network_template.format(self.network_subnet, self.network_gateway)
         # Write the Docker Compose file in config directory
         with open(f"{self.config_dir}/docker-compose.yml", "w") as f:
             f.write(docker_compose_file)
 
         # Change log and config directory in dockers to /fedstellar/app, and change controller endpoint
+        if sys.platform not in ("linux", "darwin"):
+            raise ValueError("Windows is not supported yet for Docker Compose.")
+        controller_endpoint = "host.docker.internal:{}".format(self.webserver_port)
         for node in self.config.participants:
             node['tracking_args']['log_dir'] = "/fedstellar/app/logs"
-            node['tracking_args']['config_dir'] = f"/fedstellar/app/config/{self.scenario_name}"
-            if sys.platform == "linux":
-                node['scenario_args']['controller'] = "host.docker.internal" + ":" + str(self.webserver_port)
-            elif sys.platform == "darwin":
-                node['scenario_args']['controller'] = "host.docker.internal" + ":" + str(self.webserver_port)
-            else:
-                raise ValueError("Windows is not supported yet for Docker Compose.")
-
-            # Write the config file in config directory
-            with open(f"{self.config_dir}/participant_{node['device_args']['idx']}.json", "w") as f:
-                json.dump(node, f, indent=4)
+            node['tracking_args']['config_dir'] = container_config_dir
+            node['scenario_args']['controller'] = controller_endpoint
+
+        # Write the config files in config directory (in parallel, file I/O releases the GIL)
+        participant_path = os.path.join(self.config_dir, "participant_{}.json").format
+        with ThreadPoolExecutor(max_workers=min(32, max(1, len(self.config.participants)))) as executor:
+            list(executor.map(
+                lambda node: _save_json_file(participant_path(node['device_args']['idx']), node),
+                self.config.participants,
+            ))
         # Start the Docker Compose file, catch error if any
         try:
             subprocess.check_call(["docker", "compose", "-f", f"{self.config_dir}/docker-compose.yml", "up", "-d"])
@@ -454,18 +507,18 @@ class Controller:
             raise e
 
     def start_node(self, idx):
-        command = f'cd {os.path.dirname(os.path.realpath(__file__))}; {self.python_path} -u node_start.py {str(self.config.participants_path[idx])} 2>&1'
+        command = f'cd {_MODULE_REAL_DIR}; {self.python_path} -u node_start.py {str(self.config.participants_path[idx])} 2>&1'
         print("Starting node {} with command: {}".format(idx, command))
         if sys.platform == "darwin":
             print("MacOS detected")
             os.system("""osascript -e 'tell application "Terminal" to activate' -e 'tell application "Terminal" to do script "{}"'""".format(command))
         elif sys.platform == "linux":
             print("Linux OS detected")
-            command = f'{self.python_path} -u {os.path.dirname(os.path.realpath(__file__))}/node_start.py {str(self.config.participants_path[idx])}'
-            os.system(command + " 2>&1 &")
+            # Launched without an intermediate shell and without waiting (stderr is merged into the inherited stdout)
+            subprocess.Popen([self.python_path, "-u", os.path.join(_MODULE_REAL_DIR, "node_start.py"), str(self.config.participants_path[idx])], stderr=subprocess.STDOUT)
         elif sys.platform == "win32":
             print("Windows OS detected")
-            command_win = f'cd {os.path.dirname(os.path.realpath(__file__))} {str("&&")} {self.python_path} -u node_start.py {str(self.config.participants_path[idx])} 2>&1'
+            command_win = f'cd {_MODULE_REAL_DIR} {str("&&")} {self.python_path} -u node_start.py {str(self.config.participants_path[idx])} 2>&1'
             os.system("""start cmd /k "{}" """.format(command_win))
         else:
             raise ValueError("Unknown operating system")
@@ -17,8 +17,9 @@
 
 
 import base64
+import functools
+import threading
 
-from Crypto import Random
 from Crypto.Cipher import AES
 from Crypto.Cipher import PKCS1_OAEP
 from Crypto.PublicKey import RSA
@@ -48,13 +49,28 @@ class Encrypter:
 class RSACipher(Encrypter):
     """
     Class with methods to encrypt and decrypt messages using RSA asymetric encryption.
+
+    The key pair is generated once per process (it is the expensive part of the handshake) and shared by all the instances,
+    each instance only holds the public key of its pair.
     """
 
+    __key_pair = None
+    __key_pair_lock = threading.Lock()
+
     def __init__(self):
-        random_generator = Random.new().read
-        self.__private_key = RSA.generate(1024, random_generator)
-        self.__public_key = self.__private_key.publickey()
-        self.__pair_public_key = None
+        self.__private_key, self.__serialized_public_key = RSACipher.__get_key_pair()
+        # OAEP ciphers are built once per key (not per message)
+        self.__decrypter = PKCS1_OAEP.new(self.__private_key)
+        self.__encrypter = None
+
+    @staticmethod
+    def __get_key_pair():
+        with RSACipher.__key_pair_lock:
+            if RSACipher.__key_pair is None:
+                private_key = RSA.generate(2048, e=65537)  # randomness from the OS entropy source
+                # The public key is only used serialized (it is immutable), so it is exported once
+                RSACipher.__key_pair = (private_key, base64.b64encode(private_key.publickey().exportKey("DER")))
+        return RSACipher.__key_pair
 
     def encrypt(self, message):
         """
@@ -66,8 +82,7 @@ class RSACipher(Encrypter):
         Returns:
             message: (bytes) The encrypted message.
         """
-        cipher = PKCS1_OAEP.new(self.__pair_public_key)
-        return base64.b64encode(cipher.encrypt(message))
+        return base64.b64encode(self.__encrypter.encrypt(message))
 
     def decrypt(self, message):
         """
@@ -79,8 +94,38 @@ class RSACipher(Encrypter):
         Returns:
             message: (bytes) The decrypted message.
         """
-        cipher = PKCS1_OAEP.new(self.__private_key)
-        return cipher.decrypt(base64.b64decode(message))
+        return self.__decrypter.decrypt(base64.b64decode(message))
+
+    def wrap_key(self, key):
+        """
+        Encrypts a symmetric key with the public key of the pair (hybrid encryption: RSA only protects the key, the messages are encrypted with it).
+
+        Args:
+            key: (bytes) The symmetric key.
+
+        Returns:
+            wrapped_key: (bytes) The encrypted key, of ``wrapped_key_len()`` bytes.
+        """
+        return self.__encrypter.encrypt(key)
+
+    def unwrap_key(self, wrapped_key):
+        """
+        Decrypts a symmetric key encrypted with our public key (see ``wrap_key``).
+
+        Args:
+            wrapped_key: (bytes) The encrypted key.
+
+        Returns:
+            key: (bytes) The symmetric key.
+        """
+        return self.__decrypter.decrypt(wrapped_key)
+
+    def wrapped_key_len(self):
+        """
+        Returns:
+            wrapped_key_len: (int) The length of a wrapped key in bytes (the size of the RSA modulus).
+        """
+        return self.__private_key.size_in_bytes()
 
     def load_pair_public_key(self, key):
         """
@@ -89,7 +134,13 @@ class RSACipher(Encrypter):
         Args:
             key: The key to use to decrypt the message encoded at base64.
         """
-        self.__pair_public_key = RSA.importKey(base64.b64decode(key))
+        self.__encrypter = RSACipher.__pair_encrypter(bytes(key))
+
+    @staticmethod
+    @functools.lru_cache(maxsize=256)
+    def __pair_encrypter(key):
+        # Nodes keep their key pair for the whole process, so reconnections of the same node reuse the parsed key (and its OAEP cipher, which is stateless)
+        return PKCS1_OAEP.new(RSA.importKey(base64.b64decode(key)))
 
     def get_key(self):
         """
@@ -98,7 +149,7 @@ class RSACipher(Encrypter):
         Returns:
             key: The serialized key encoded at base64.
         """
-        return base64.b64encode(self.__public_key.exportKey("DER"))
+        return self.__serialized_public_key
 
 
 ##############################
@@ -109,32 +160,41 @@ class RSACipher(Encrypter):
 class AESCipher(Encrypter):
     """
     Class with methods to encrypt and decrypt messages using AES symetric encryption.
+
+    AES is used in CTR mode: each direction of the connection is a keystream, so messages don't need padding and the received
+    data can be decrypted in chunks of any size (as TCP delivers it). The node that generates the key encrypts with one nonce and the
+    node that receives the key with the other one, so the two directions never share keystream. Messages have to be encrypted in the
+    same order they are sent (and decrypted in the order they are received).
     """
 
+    # Nonces of the keystreams: [0] is used to encrypt by the node that generates the key, [1] by the node that receives it
+    __NONCES = (b"\x00" * 8, b"\xff" * 8)
+
     def __init__(self, key=None):
         self.bs = AES.block_size
         self.key = key
-        if key is None:
-            self.key = get_random_bytes(16)  # 256 bits
-        self.cipher = AES.new(self.key, AES.MODE_ECB)
+        generated = key is None
+        if generated:
+            self.key = get_random_bytes(AESCipher.key_len())  # 128 bits
+        enc_nonce, dec_nonce = AESCipher.__NONCES if generated else AESCipher.__NONCES[::-1]
+        self.__encrypter = AES.new(self.key, AES.MODE_CTR, nonce=enc_nonce)
+        self.__decrypter = AES.new(self.key, AES.MODE_CTR, nonce=dec_nonce)
 
     def encrypt(self, message):
         """
-        Encrypts a message using AES. Message is encrypted using the shared key.
-        Keep in mind that AES uses a block cipher, so the message sould be filled with padding.
+        Encrypts a message using AES. Message is encrypted using the shared key (next bytes of the sending keystream).
 
         Args:
-            message: (str) The message to encrypt.
+            message: (bytes) The message to encrypt.
 
         Returns:
-            message: (str) The encrypted message.
+            message: (bytes) The encrypted message.
         """
-        return self.cipher.encrypt(message)
+        return self.__encrypter.encrypt(message)
 
     def decrypt(self, message):
         """
-        Decrypts a message using AES. Message is decripted using the shared key.
-        Keep in mind that AES uses a block cipher, so the message can be a filled message with padding.
+        Decrypts a message using AES. Message is decripted using the shared key (next bytes of the receiving keystream).
 
         Args:
             message: (bytes) The message to decrypt.
@@ -142,30 +202,7 @@ class AESCipher(Encrypter):
         Returns:
             message: (bytes) The decrypted message.
         """
-        return self.cipher.decrypt(message)
-
-    def add_padding(self, msg):
-        """
-        Add padding to an encoded UTF-8 text. Adds " " charactets (1 byte) to fill the rest with the block.
-        Careful: in this case, the filling content doesn't affect to the meaning of messages.
-
-        Args:
-            msg: (bytes) The encoded text.
-
-        Returns:
-            msg: (bytes) The encoded text with padding.
-        """
-        # Calculate the number of bytes needed to fill the block
-        bytes_left = self.bs - len(msg) % self.bs
-        if bytes_left == self.bs:
-            bytes_left = 0
-
-        # Add padding
-        pading_char = " ".encode("utf-8")
-        for i in range(bytes_left):
-            msg += pading_char
-
-        return msg
+        return self.__decrypter.decrypt(message)
 
     def get_key(self):
         """
@@ -190,4 +227,4 @@ class AESCipher(Encrypter):
         Returns:
             key_len: (int) The length of the key in bytes.
         """
-        return 256
+        return 16
@@ -15,6 +15,7 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
 
+import itertools
 import logging
 import threading
 import time
@@ -36,7 +37,7 @@ class Gossiper(threading.Thread, Observable):
 
     Args:
         nodo_padre (str): Name of the parent node.
-        neighbors (list): List of neighbors.
+        neighbors (callable): Returns the current (immutable) snapshot of the neighbors of the parent node.
 
     """
 
@@ -44,7 +45,7 @@ class Gossiper(threading.Thread, Observable):
         Observable.__init__(self)
         threading.Thread.__init__(self, name=("gossiper-" + node_name))
         self.node_name = node_name
-        self.__neighbors = neighbors  # list as reference of the original neighbors list
+        self.__neighbors = neighbors  # getter of the published neighbors snapshot
         self.config = config
         self.__msgs = {}
         self.__add_lock = threading.Lock()
@@ -58,9 +59,10 @@ class Gossiper(threading.Thread, Observable):
             msgs (list): List of messages to add.
             node (Node): Node that sent the messages.
         """
+        nodes = frozenset((node,))  # nodes that already have the messages (shared, frozensets are never modified)
         self.__add_lock.acquire()
         for msg in msgs:
-            self.__msgs[msg] = [node]
+            self.__msgs[msg] = nodes
         self.__add_lock.release()
 
     def run(self):
@@ -74,37 +76,41 @@ class Gossiper(threading.Thread, Observable):
             # Lock
             self.__add_lock.acquire()
             begin = time.time()
+            batch = []  # (msg, excluded nodes) to send in this round, notified at once
 
             # Send to all the nodes except the ones that the message was already sent to
             if len(self.__msgs) > 0:
-                msg_list = list(self.__msgs.items()).copy()
-                logging.debug("[GOSSIPER] Message list: {}".format(msg_list))
-                nei = set(self.__neighbors.copy())  # copy to avoid concurrent problems
+                msg_list = list(self.__msgs.items())
+                logging.debug("[GOSSIPER] Message list: %s", msg_list)
+                nei = frozenset(self.__neighbors())  # snapshot is immutable, no lock needed
 
+                # Set algebra over frozensets (nodes that already have each message), without per-message conversions
                 for msg, nodes in msg_list:
-                    nodes = set(nodes)
-                    sended = len(nei - nodes)
+                    remaining = nei - nodes
+                    sended = len(remaining)
 
                     if messages_left - sended >= 0:
-                        logging.debug("[GOSSIPER] Send msg: {} --> to {}".format(msg, list(nodes)))
-                        self.notify(Events.GOSSIP_BROADCAST_EVENT, (msg, list(nodes)))
+                        logging.debug("[GOSSIPER] Send msg: %s --> excluded: %s", msg, nodes)
+                        batch.append((msg, nodes))
                         del self.__msgs[msg]
                         messages_left = messages_left - sended
                         if messages_left == 0:
                             break
                     else:
-                        # Lists to concatenate / Sets to difference
-                        excluded = (list(nei - nodes))[: abs(messages_left - sended)]
-                        logging.debug("[GOSSIPER] Send msg: {} --> to {} | Excluded: {}".format(msg, list(nodes) + excluded, excluded))
-                        self.notify(
-                            Events.GOSSIP_BROADCAST_EVENT, (msg, list(nodes) + excluded)
-                        )
-                        self.__msgs[msg] = list(nodes) + list(nei - set(excluded))
+                        # Only ``messages_left`` of the remaining nodes are sent the message, the rest are excluded for next rounds
+                        excluded = frozenset(itertools.islice(remaining, sended - messages_left))
+                        logging.debug("[GOSSIPER] Send msg: %s --> excluded: %s | Pending: %s", msg, nodes | excluded, excluded)
+                        batch.append((msg, nodes | excluded))
+                        self.__msgs[msg] = nodes | (nei - excluded)
                         break
 
             # Unlock
             self.__add_lock.release()
 
+            # One event per round: the messages for each neighbor are sent together
+            if batch:
+                self.notify(Events.GOSSIP_BROADCAST_EVENT, batch)
+
             # Wait to guarantee the frequency of gossipping
             time_diff = time.time() - begin
             time_sleep = 1 / self.config.participant["GOSSIP_MESSAGES_FREC"] - time_diff
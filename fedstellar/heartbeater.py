@@ -16,6 +16,7 @@
 #
 
 
+import heapq
 import logging
 import threading
 import time
@@ -52,10 +53,14 @@ class Heartbeater(threading.Thread, Observable):
 
         self.__count = 0
 
-        # List of neighbors
+        # Getter of the published snapshot of the neighbors (NodeConnections)
         self.__neighbors = neighbors
+        self.__last_neighbors = (None, None)  # (snapshot, string) written in the config the last time
         self.__nodes = {}
         self.__nodes_role = {}
+        # Min-heap of (last beat, node): a sweep stops at the first node not expired. Entries of nodes that sent a newer beat are stale and skipped
+        self.__expiry_heap = []
+        self.__nodes_lock = threading.Lock()  # add_node is called from the connections, clear_nodes from the heartbeater
 
     def run(self):
         """
@@ -89,16 +94,18 @@ class Heartbeater(threading.Thread, Observable):
         """
         Clear the list of neighbors.
         """
-        for n in [
-            node
-            for node, t in list(self.__nodes.items())
-            if time.time() - t > self.config.participant["NODE_TIMEOUT"]
-        ]:
-            logging.debug(
-                "[HEARTBEATER] Removed {} from the network ".format(n)
-            )
-            self.__nodes.pop(n)
-            self.__nodes_role.pop(n)
+        limit = time.time() - self.config.participant["NODE_TIMEOUT"]
+        heap = self.__expiry_heap
+        with self.__nodes_lock:
+            while heap and heap[0][0] < limit:
+                t, n = heapq.heappop(heap)
+                if self.__nodes.get(n) != t:
+                    continue  # stale entry (a newer beat was received) or node already removed
+                logging.debug(
+                    "[HEARTBEATER] Removed {} from the network ".format(n)
+                )
+                self.__nodes.pop(n)
+                self.__nodes_role.pop(n, None)
 
     def add_node(self, node):
         """
@@ -108,7 +115,10 @@ class Heartbeater(threading.Thread, Observable):
             node (Node): Node to add to the list of neighbors.
         """
         if node != self.__node_name:
-            self.__nodes[node] = time.time()
+            now = time.time()
+            with self.__nodes_lock:
+                self.__nodes[node] = now
+                heapq.heappush(self.__expiry_heap, (now, node))
 
     def add_node_role(self, node, role):
         """
@@ -134,7 +144,7 @@ class Heartbeater(threading.Thread, Observable):
         if print:
             logging.info("[HEARTBEATER] Nodes heartbeater: {}".format(node_list))  # All nodes in the network
             logging.info("[HEARTBEATER] Nodes role: {}".format(self.__nodes_role))  # All nodes in the network
-            logging.info("[HEARTBEATER] Nodes reference basenode: {}".format(self.__neighbors))  # NodeConnections only with the neighbors
+            logging.info("[HEARTBEATER] Nodes reference basenode: {}".format(self.__neighbors()))  # NodeConnections only with the neighbors
 
         return node_list
     def stop(self):
@@ -146,10 +156,14 @@ class Heartbeater(threading.Thread, Observable):
     def update_config_with_neighbors(self):
         """
         Update the config with the actual neighbors.
+        Snapshots are replaced (never modified) when the neighbors change, so the string is only rebuilt if the snapshot is a different one
+        (or if the value in the config was changed by someone else).
         """
-        neigbors = ''
-        for node in self.__neighbors:
-            neigbors += node.get_addr()[0] + ":" + str(node.get_addr()[1])
-            if node != self.__neighbors[-1]:
-                neigbors += " "
-        self.config.participant["network_args"]['neighbors'] = neigbors
+        neighbors = self.__neighbors()
+        network_args = self.config.participant["network_args"]
+        last_neighbors, last_string = self.__last_neighbors
+        if neighbors is last_neighbors and network_args['neighbors'] is last_string:
+            return
+        neighbors_string = " ".join("{}:{}".format(*node.get_addr()) for node in neighbors)
+        network_args['neighbors'] = neighbors_string
+        self.__last_neighbors = (neighbors, neighbors_string)
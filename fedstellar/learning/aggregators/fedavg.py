@@ -10,6 +10,9 @@ import torch
 
 from fedstellar.learning.aggregators.aggregator import Aggregator
 
+# Layers stored in these dtypes are accumulated in float32 (and the average is cast back), so the weighted sum keeps its precision
+_LOW_PRECISION_DTYPES = (torch.float16, torch.bfloat16)
+
 
 class FedAvg(Aggregator):
     """
@@ -42,19 +45,25 @@ class FedAvg(Aggregator):
         # Total Samples
         total_samples = sum([y for _, y in models])
 
-        # Create a Zero Model
-        accum = (models[-1][0]).copy()
-        for layer in accum:
-            accum[layer] = torch.zeros_like(accum[layer])
+        # Normalized weights (the division is made once for all the layers, not per layer), as tensors per dtype/device
+        normalized = [w / total_samples for _, w in models]
+        weights = {}
 
-        # Add weighteds models
+        # Weighted average per layer as a single contraction over the stacked models
         logging.info("[FedAvg.aggregate] Aggregating models: num={}".format(len(models)))
-        for m, w in models:
-            for layer in m:
-                accum[layer] = accum[layer] + m[layer] * w
-
-        # Normalize Accum
-        for layer in accum:
-            accum[layer] = accum[layer] / total_samples
+        accum = {}
+        for layer in models[-1][0]:
+            stacked = torch.stack([m[layer] for m, _ in models])
+            layer_dtype = stacked.dtype
+            if layer_dtype in _LOW_PRECISION_DTYPES:
+                stacked = stacked.float()
+            elif not stacked.is_floating_point():
+                stacked = stacked.to(torch.get_default_dtype())
+            key = (stacked.dtype, stacked.device)
+            if key not in weights:
+                weights[key] = torch.tensor(normalized, dtype=stacked.dtype, device=stacked.device)
+            accum[layer] = torch.tensordot(weights[key], stacked, dims=1)
+            if layer_dtype in _LOW_PRECISION_DTYPES:
+                accum[layer] = accum[layer].to(layer_dtype)
 
         return accum
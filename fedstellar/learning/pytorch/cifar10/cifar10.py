@@ -2,12 +2,14 @@
 # This file is part of the fedstellar framework (see https://github.com/enriquetomasmb/fedstellar).
 # Copyright (c) 2022 Enrique Tomás Martínez Beltrán.
 #
+import os
 from math import floor
 
+import numpy as np
 # To Avoid Crashes with a lot of nodes
 import torch.multiprocessing
 import lightning as pl
-from torch.utils.data import DataLoader
+from torch.utils.data import DataLoader, Dataset
 from torchvision import transforms as T
 from torchvision.datasets import CIFAR10
 
@@ -16,8 +18,59 @@ from pathlib import Path
 from PIL import Image
 import pandas as pd
 
+from fedstellar.learning.pytorch.datautils import loader_kwargs
+
+
+class CIFAR10Tensors(Dataset):
+    """
+    CIFAR10 subset already converted to ``uint8`` CHW tensors (``N x 3 x 32 x 32``), so no PIL image or per-sample transform is needed.
+    Augmentation and normalization are made per batch, once it is in the device (see ``CIFAR10DataModule.on_after_batch_transfer``).
+
+    Args:
+        images: Images (tensor, may be backed by a memory-mapped file).
+        targets: Labels (tensor).
+    """
+
+    def __init__(self, images, targets):
+        self.images = images
+        self.targets = targets
+
+    def __len__(self):
+        return len(self.targets)
+
+    def __getitem__(self, index):
+        return self.images[index], self.targets[index]
+
+
+def random_crop_flip(images, padding=4):
+    """
+    ``RandomCrop(32, padding=4)`` + ``RandomHorizontalFlip()`` over a batch of images (``B x C x H x W``), with a different crop and flip per image.
+    The padding is black (zeros), as the padding made over the PIL images.
+    """
+    b, c, h, w = images.shape
+    device = images.device
+    padded = torch.nn.functional.pad(images, (padding, padding, padding, padding))
+    offsets = torch.randint(0, 2 * padding + 1, (2, b, 1), device=device)
+    rows = offsets[0] + torch.arange(h, device=device)
+    cols = offsets[1] + torch.arange(w, device=device)
+    flip = torch.rand(b, 1, device=device) < 0.5
+    cols = torch.where(flip, cols.flip(1), cols)
+    return padded[
+        torch.arange(b, device=device).view(b, 1, 1, 1),
+        torch.arange(c, device=device).view(1, c, 1, 1),
+        rows.view(b, 1, h, 1),
+        cols.view(b, 1, 1, w),
+    ]
+
 
 class CIFAR10DataModule(pl.LightningDataModule):
+    """
+    LightningDataModule of partitioned CIFAR10.
+
+    Its DataLoaders return raw ``uint8`` images (``B x 3 x 32 x 32``): augmentation (training) and normalization are made per batch in the device,
+    by ``on_after_batch_transfer`` when they are used by a Lightning trainer. Other consumers of the DataLoaders have to call ``preprocess_batch`` on each batch.
+    """
+
     def __init__(self, normalization="cifar10", loading="torchvision", sub_id=0, number_sub=1, num_workers=4, batch_size=32, iid=True, root_dir="./data"):
         super().__init__()
         self.sub_id = sub_id
@@ -30,6 +83,10 @@ class CIFAR10DataModule(pl.LightningDataModule):
         self.normalization = normalization
         self.mean = self.set_normalization(normalization)["mean"]
         self.std = self.set_normalization(normalization)["std"]
+        self.normalization_tensors = {}  # device -> (scale, shift) of the normalization of uint8 images
+        # DataLoaders are created once: their workers are kept alive between epochs (and rounds)
+        self.train_loader = None
+        self.val_loader = None
 
     def set_normalization(self, normalization):
         # Image classification on the CIFAR10 dataset - Albumentations Documentation https://albumentations.ai/docs/autoalbument/examples/cifar10/
@@ -58,59 +115,96 @@ class CIFAR10DataModule(pl.LightningDataModule):
             raise NotImplementedError
         return dataset
 
-    def train_dataloader(self):
-        transform = T.Compose(
-            [
-                T.RandomCrop(32, padding=4),
-                T.RandomHorizontalFlip(),
-                T.ToTensor(),
-                T.Normalize(self.mean, self.std),
-            ]
-        )
-        dataset = self.get_dataset(
-            train=True,
-            transform=transform,
-        )
+    def get_subset_tensors(self, train):
+        """
+        Subset of the node as ``uint8`` CHW tensors. They are computed once (vectorized over the raw data) and saved in ``root_dir``,
+        next uses memory-map the saved arrays (pages are shared by the DataLoader workers).
+
+        Returns:
+            (images, targets) tensors.
+        """
+        name = "cifar10_{}_{}of{}".format("train" if train else "test", self.sub_id, self.number_sub)
+        images_path = os.path.join(self.root_dir, name + "_images.npy")
+        targets_path = os.path.join(self.root_dir, name + "_targets.npy")
+        if not (os.path.exists(images_path) and os.path.exists(targets_path)):
+            dataset = self.get_dataset(train=train, transform=None)
+            # To Avoid same data in all nodes
+            rows_by_sub = floor(len(dataset) / self.number_sub)
+            rows = slice(self.sub_id * rows_by_sub, (self.sub_id + 1) * rows_by_sub)
+            images = np.ascontiguousarray(dataset.data[rows].transpose(0, 3, 1, 2))  # NHWC -> NCHW
+            targets = np.asarray(dataset.targets[rows], dtype=np.int64)
+            # Saved with a temporary name, so a partial file is never taken as the cache
+            for path, array in ((images_path, images), (targets_path, targets)):
+                tmp_path = "{}.{}.tmp.npy".format(path[:-len(".npy")], os.getpid())
+                np.save(tmp_path, array)
+                os.replace(tmp_path, path)
+        # Copy-on-write mapping: writable for torch, but the file is never modified
+        images = torch.from_numpy(np.load(images_path, mmap_mode="c"))
+        targets = torch.from_numpy(np.load(targets_path, mmap_mode="c"))
+        return images, targets
+
+    def on_after_batch_transfer(self, batch, dataloader_idx):
+        """
+        Augmentation (only in training) and normalization of the whole batch, already in the device.
+        """
+        return self.preprocess_batch(batch, train=self.trainer is not None and self.trainer.training)
 
-        # To Avoid same data in all nodes
-        rows_by_sub = floor(len(dataset) / self.number_sub)
-        cifar10_train = torch.utils.data.Subset(dataset, range(self.sub_id * rows_by_sub, (self.sub_id + 1) * rows_by_sub))
+    def preprocess_batch(self, batch, train=False):
+        """
+        Augmentation (if ``train``) and normalization of a batch of the DataLoaders (``uint8`` images), in the device of the batch.
 
-        dataloader = DataLoader(
+        Args:
+            batch: (images, targets) batch.
+            train: If True, the images are augmented (random crop and horizontal flip).
+
+        Returns:
+            (images, targets) with the images normalized as ``float32``.
+        """
+        images, targets = batch
+        if train:
+            images = random_crop_flip(images)
+        # (x / 255 - mean) / std == x * scale - shift, with scale and shift computed once per device
+        if images.device not in self.normalization_tensors:
+            mean = torch.tensor(self.mean, dtype=torch.float32).view(1, -1, 1, 1)
+            std = torch.tensor(self.std, dtype=torch.float32).view(1, -1, 1, 1)
+            self.normalization_tensors[images.device] = ((1 / (255 * std)).to(images.device), (mean / std).to(images.device))
+        scale, shift = self.normalization_tensors[images.device]
+        images = images.float().mul_(scale).sub_(shift)
+        return images, targets
+
+    def train_dataloader(self):
+        if self.train_loader is not None:
+            return self.train_loader
+        images, targets = self.get_subset_tensors(train=True)
+        cifar10_train = CIFAR10Tensors(images, targets)
+
+        self.train_loader = DataLoader(
             cifar10_train,
             batch_size=self.batch_size,
-            num_workers=self.num_workers,
             shuffle=True,
             drop_last=True,
-            pin_memory=False,
+            **loader_kwargs(self.num_workers),
         )
 
         print(f"Train Dataset Size: {len(cifar10_train)}")
 
-        return dataloader
+        return self.train_loader
 
     def val_dataloader(self):
-        transform = T.Compose(
-            [
-                T.ToTensor(),
-                T.Normalize(self.mean, self.std),
-            ]
-        )
-        dataset = self.get_dataset(train=False, transform=transform)
-        # To Avoid same data in all nodes
-        rows_by_sub = floor(len(dataset) / self.number_sub)
-        cifar10_val = torch.utils.data.Subset(dataset, range(self.sub_id * rows_by_sub, (self.sub_id + 1) * rows_by_sub))
+        if self.val_loader is not None:
+            return self.val_loader
+        images, targets = self.get_subset_tensors(train=False)
+        cifar10_val = CIFAR10Tensors(images, targets)
         print(f"Val/Test Dataset Size: {len(cifar10_val)}")
         print(f"Example: {cifar10_val[0][0].shape}")
-        dataloader = DataLoader(
+        self.val_loader = DataLoader(
             cifar10_val,
             batch_size=self.batch_size,
-            num_workers=self.num_workers,
             drop_last=True,
-            pin_memory=False,
+            **loader_kwargs(self.num_workers),
         )
 
-        return dataloader
+        return self.val_loader
 
     def test_dataloader(self):
         return self.val_dataloader()
@@ -0,0 +1,69 @@
+#
+# This file is part of the fedstellar framework (see https://github.com/enriquetomasmb/fedstellar).
+# Copyright (c) 2022 Enrique Tomás Martínez Beltrán.
+#
+
+
+"""
+Utilities shared by the LightningDataModules of the datasets.
+"""
+from math import floor
+
+import torch
+from torch.utils.data import Subset
+
+# Seed of the permutation that splits the partition of a node into training and validation sets (the same split in every run)
+SPLIT_SEED = 42
+
+
+class BatchSubset(Subset):
+    """
+    ``Subset`` that forwards batch fetches (``__getitems__``, used by the DataLoader) to its dataset, so a batch is taken with one indexing operation.
+    ``torch.utils.data.Subset`` only does it from torch 2.1. Datasets without ``__getitems__`` are fetched sample by sample.
+    """
+
+    def __getitems__(self, indexes):
+        indexes = [self.indices[i] for i in indexes]
+        getitems = getattr(self.dataset, "__getitems__", None)
+        if getitems is not None:
+            return getitems(indexes)
+        return [self.dataset[i] for i in indexes]
+
+
+def split_train_val(dataset, sub_id, number_sub, val_percent):
+    """
+    Takes the partition ``sub_id`` (out of ``number_sub`` contiguous partitions) of a dataset and splits it into training and validation sets.
+    Each one is a single level of ``BatchSubset`` over the dataset, split by a permutation with a fixed seed (``SPLIT_SEED``), so it is reproducible.
+
+    Args:
+        dataset: The whole dataset.
+        sub_id: Subset id of partition. (0 <= sub_id < number_sub)
+        number_sub: Number of subsets.
+        val_percent: The percentage of the validation set.
+
+    Returns:
+        (training set, validation set)
+    """
+    rows_by_sub = floor(len(dataset) / number_sub)
+    indices = torch.randperm(rows_by_sub, generator=torch.Generator().manual_seed(SPLIT_SEED)) + sub_id * rows_by_sub
+    n_train = round(rows_by_sub * (1 - val_percent))
+    return BatchSubset(dataset, indices[:n_train].tolist()), BatchSubset(dataset, indices[n_train:].tolist())
+
+
+def loader_kwargs(num_workers):
+    """
+    Keyword arguments shared by the DataLoaders of the datamodules: workers are kept alive between epochs (and rounds) and prefetch batches,
+    which are page-locked for the copy to the GPU (only if there is one).
+
+    Args:
+        num_workers: The number of workers of the data.
+
+    Returns:
+        dict with the keyword arguments.
+    """
+    return {
+        "num_workers": num_workers,
+        "pin_memory": torch.cuda.is_available(),
+        "persistent_workers": num_workers > 0,
+        "prefetch_factor": 4 if num_workers > 0 else None,
+    }
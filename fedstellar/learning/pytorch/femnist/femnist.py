@@ -13,11 +13,13 @@ from collections import defaultdict
 import torch.multiprocessing
 from PIL import Image
 from lightning import LightningDataModule
-from torch.utils.data import DataLoader, Subset, random_split, Dataset
+from torch.utils.data import DataLoader, Dataset
 from torchvision.datasets import MNIST, utils
 from torchvision import transforms
 import numpy as np
 
+from fedstellar.learning.pytorch.datautils import BatchSubset, loader_kwargs, split_train_val
+
 torch.multiprocessing.set_sharing_strategy("file_system")
 
 
@@ -132,30 +134,24 @@ class FEMNISTDataModule(LightningDataModule):
                 transforms.Normalize((0.1307,), (0.3081,))]
         )
 
-        self.train = FEMNIST(sub_id=self.sub_id, number_sub=self.number_sub, root_dir=root_dir, train=True, transform=transform_data, target_transform=None, download=True)
-        self.test = FEMNIST(sub_id=self.sub_id, number_sub=self.number_sub, root_dir=root_dir, train=False, transform=transform_data, target_transform=None, download=True)
+        # Singletons of FEMNIST train and test datasets (the whole dataset is loaded only once per process, shared by all the nodes)
+        if FEMNISTDataModule.femnist_train is None:
+            FEMNISTDataModule.femnist_train = FEMNIST(sub_id=self.sub_id, number_sub=self.number_sub, root_dir=root_dir, train=True, transform=transform_data, target_transform=None, download=True)
+        if FEMNISTDataModule.femnist_val is None:
+            FEMNISTDataModule.femnist_val = FEMNIST(sub_id=self.sub_id, number_sub=self.number_sub, root_dir=root_dir, train=False, transform=transform_data, target_transform=None, download=True)
+        self.train = FEMNISTDataModule.femnist_train
+        self.test = FEMNISTDataModule.femnist_val
 
         if len(self.test) < self.number_sub:
             raise ValueError("Too many partitions")
 
         # Training / validation set
-        trainset = self.train
-        rows_by_sub = floor(len(trainset) / self.number_sub)
-        tr_subset = Subset(
-            trainset, range(self.sub_id * rows_by_sub, (self.sub_id + 1) * rows_by_sub)
-        )
-        femnist_train, femnist_val = random_split(
-            tr_subset,
-            [
-                round(len(tr_subset) * (1 - self.val_percent)),
-                round(len(tr_subset) * self.val_percent),
-            ],
-        )
+        femnist_train, femnist_val = split_train_val(self.train, self.sub_id, self.number_sub, self.val_percent)
 
         # Test set
         testset = self.test
         rows_by_sub = floor(len(testset) / self.number_sub)
-        te_subset = Subset(
+        te_subset = BatchSubset(
             testset, range(self.sub_id * rows_by_sub, (self.sub_id + 1) * rows_by_sub)
         )
 
@@ -164,19 +160,19 @@ class FEMNISTDataModule(LightningDataModule):
             femnist_train,
             batch_size=self.batch_size,
             shuffle=True,
-            num_workers=self.num_workers,
+            **loader_kwargs(self.num_workers),
         )
         self.val_loader = DataLoader(
             femnist_val,
             batch_size=self.batch_size,
             shuffle=False,
-            num_workers=self.num_workers,
+            **loader_kwargs(self.num_workers),
         )
         self.test_loader = DataLoader(
             te_subset,
             batch_size=self.batch_size,
             shuffle=False,
-            num_workers=self.num_workers,
+            **loader_kwargs(self.num_workers),
         )
         print(
             "Train: {} Val:{} Test:{}".format(
@@ -14,6 +14,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
+import copy
 import os
 import sys
 from math import floor
@@ -21,13 +22,32 @@ from math import floor
 # To Avoid Crashes with a lot of nodes
 import torch.multiprocessing
 from lightning import LightningDataModule
-from torch.utils.data import DataLoader, Subset, random_split
-from torchvision import transforms
+from torch.utils.data import DataLoader
 from torchvision.datasets import MNIST
 
+from fedstellar.learning.pytorch.datautils import BatchSubset, loader_kwargs, split_train_val
+
 torch.multiprocessing.set_sharing_strategy("file_system")
 
 
+class FastMNIST(MNIST):
+    """
+    MNIST with all the images converted once to a float tensor (N, 1, 28, 28) scaled to [0, 1].
+    Samples are returned as tensors directly, without the per-sample PIL image and ``ToTensor`` conversions of torchvision.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.data = self.data.unsqueeze(1).float().div_(255)
+
+    def __getitem__(self, index):
+        return self.data[index], int(self.targets[index])
+
+    def __getitems__(self, indexes):
+        # Batch fetch (used by the DataLoader): one indexing operation for all the samples of the batch
+        return list(zip(self.data[indexes], self.targets[indexes].tolist()))
+
+
 #######################################
 #    FederatedDataModule for MNIST    #
 #######################################
@@ -48,6 +68,8 @@ class MNISTDataModule(LightningDataModule):
     # Singleton
     mnist_train = None
     mnist_val = None
+    mnist_train_sorted = None
+    mnist_val_sorted = None
 
     def __init__(
             self,
@@ -70,50 +92,31 @@ class MNISTDataModule(LightningDataModule):
             os.makedirs(f"{sys.path[0]}/data")
 
         if MNISTDataModule.mnist_train is None:
-            MNISTDataModule.mnist_train = MNIST(
-                f"{sys.path[0]}/data", train=True, download=True, transform=transforms.ToTensor()
+            MNISTDataModule.mnist_train = FastMNIST(
+                f"{sys.path[0]}/data", train=True, download=True
             )
-            if not iid:
-                sorted_indexes = MNISTDataModule.mnist_train.targets.sort()[1]
-                MNISTDataModule.mnist_train.targets = (
-                    MNISTDataModule.mnist_train.targets[sorted_indexes]
-                )
-                MNISTDataModule.mnist_train.data = MNISTDataModule.mnist_train.data[
-                    sorted_indexes
-                ]
         if MNISTDataModule.mnist_val is None:
-            MNISTDataModule.mnist_val = MNIST(
-                f"{sys.path[0]}/data", train=False, download=True, transform=transforms.ToTensor()
+            MNISTDataModule.mnist_val = FastMNIST(
+                f"{sys.path[0]}/data", train=False, download=True
             )
-            if not iid:
-                sorted_indexes = MNISTDataModule.mnist_val.targets.sort()[1]
-                MNISTDataModule.mnist_val.targets = MNISTDataModule.mnist_val.targets[
-                    sorted_indexes
-                ]
-                MNISTDataModule.mnist_val.data = MNISTDataModule.mnist_val.data[
-                    sorted_indexes
-                ]
+        if iid:
+            trainset, testset = MNISTDataModule.mnist_train, MNISTDataModule.mnist_val
+        else:
+            # Datasets sorted by label (non-IID partitions), sorted only once and shared by all the instances
+            if MNISTDataModule.mnist_train_sorted is None:
+                MNISTDataModule.mnist_train_sorted = self.__sort_by_target(MNISTDataModule.mnist_train)
+            if MNISTDataModule.mnist_val_sorted is None:
+                MNISTDataModule.mnist_val_sorted = self.__sort_by_target(MNISTDataModule.mnist_val)
+            trainset, testset = MNISTDataModule.mnist_train_sorted, MNISTDataModule.mnist_val_sorted
         if self.sub_id + 1 > self.number_sub:
             raise ("Not exist the subset {}".format(self.sub_id))
 
         # Training / validation set
-        trainset = MNISTDataModule.mnist_train
-        rows_by_sub = floor(len(trainset) / self.number_sub)
-        tr_subset = Subset(
-            trainset, range(self.sub_id * rows_by_sub, (self.sub_id + 1) * rows_by_sub)
-        )
-        mnist_train, mnist_val = random_split(
-            tr_subset,
-            [
-                round(len(tr_subset) * (1 - self.val_percent)),
-                round(len(tr_subset) * self.val_percent),
-            ],
-        )
+        mnist_train, mnist_val = split_train_val(trainset, self.sub_id, self.number_sub, self.val_percent)
 
         # Test set
-        testset = MNISTDataModule.mnist_val
         rows_by_sub = floor(len(testset) / self.number_sub)
-        te_subset = Subset(
+        te_subset = BatchSubset(
             testset, range(self.sub_id * rows_by_sub, (self.sub_id + 1) * rows_by_sub)
         )
 
@@ -125,19 +128,19 @@ class MNISTDataModule(LightningDataModule):
             mnist_train,
             batch_size=self.batch_size,
             shuffle=True,
-            num_workers=self.num_workers,
+            **loader_kwargs(self.num_workers),
         )
         self.val_loader = DataLoader(
             mnist_val,
             batch_size=self.batch_size,
             shuffle=False,
-            num_workers=self.num_workers,
+            **loader_kwargs(self.num_workers),
         )
         self.test_loader = DataLoader(
             te_subset,
             batch_size=self.batch_size,
             shuffle=False,
-            num_workers=self.num_workers,
+            **loader_kwargs(self.num_workers),
         )
         print(
             "Train: {} Val:{} Test:{}".format(
@@ -145,6 +148,15 @@ class MNISTDataModule(LightningDataModule):
             )
         )
 
+    @staticmethod
+    def __sort_by_target(dataset):
+        # Shallow copy of the dataset (the unsorted singleton is kept for IID partitions) with data and targets sorted by label
+        sorted_dataset = copy.copy(dataset)
+        sorted_indexes = torch.argsort(dataset.targets, stable=False)
+        sorted_dataset.targets = dataset.targets[sorted_indexes]
+        sorted_dataset.data = dataset.data[sorted_indexes]
+        return sorted_dataset
+
     def train_dataloader(self):
         """ """
         return self.train_loader
@@ -4,19 +4,24 @@
 #
 import os
 import zipfile
-import ast
 from math import floor
 
+import numpy as np
 import pandas as pd
 # To Avoid Crashes with a lot of nodes
 import torch.multiprocessing
 from lightning import LightningDataModule
 from sklearn.model_selection import train_test_split
-from torch.utils.data import DataLoader, Subset, random_split, Dataset
+from torch.utils.data import DataLoader, Dataset
 from torchvision.datasets import utils
 
+from fedstellar.learning.pytorch.datautils import BatchSubset, loader_kwargs, split_train_val
+
 torch.multiprocessing.set_sharing_strategy("file_system")
 
+# Processed arrays loaded in the process: (data file, targets file) -> (data, targets)
+_loaded_arrays = {}
+
 
 class SYSCALL(Dataset):
     def __init__(self, sub_id, number_sub, root_dir, train=True, transform=None, target_transform=None, download=False):
@@ -28,10 +33,10 @@ class SYSCALL(Dataset):
         self.download_link = 'https://files.ifi.uzh.ch/CSG/research/fl/data/syscall.zip'
         self.train = train
         self.root = root_dir
-        self.training_file = f'{self.root}/syscall/processed/syscall_train.pt'
-        self.test_file = f'{self.root}/syscall/processed/syscall_test.pt'
+        self.training_files = (f'{self.root}/syscall/processed/syscall_train_data.npy', f'{self.root}/syscall/processed/syscall_train_targets.npy')
+        self.test_files = (f'{self.root}/syscall/processed/syscall_test_data.npy', f'{self.root}/syscall/processed/syscall_test_targets.npy')
 
-        if not os.path.exists(f'{self.root}/syscall/processed/syscall_test.pt') or not os.path.exists(f'{self.root}/syscall/processed/syscall_train.pt'):
+        if not all(os.path.exists(f) for f in self.training_files + self.test_files):
             if self.download:
                 self.dataset_download()
                 self.process()
@@ -41,22 +46,34 @@ class SYSCALL(Dataset):
             print('SYSCALL dataset already downloaded and processed.')
 
         if self.train:
-            data_file = self.training_file
+            data_files = self.training_files
         else:
-            data_file = self.test_file
+            data_files = self.test_files
 
         # Whole dataset
-        data_and_targets = torch.load(data_file)
-        self.data, self.targets = data_and_targets[0], data_and_targets[1]
+        self.data, self.targets = SYSCALL.load_arrays(data_files)
+
+    @staticmethod
+    def load_arrays(files):
+        """
+        Loads the processed arrays (data, targets) as tensors. They are memory-mapped once per process (copy-on-write),
+        so all the datasets of the process and the DataLoader workers (forked) share the same pages instead of deserializing a copy each.
+        """
+        if files not in _loaded_arrays:
+            _loaded_arrays[files] = tuple(torch.from_numpy(np.load(f, mmap_mode='c')) for f in files)
+        return _loaded_arrays[files]
+
+    def __len__(self):
+        return len(self.data)
 
     def __getitem__(self, index):
         img, target = self.data[index], int(self.targets[index])
-        if self.transform is not None:
-            img = img
-        if self.target_transform is not None:
-            target = target
         return img, target
 
+    def __getitems__(self, indexes):
+        # Batch fetch (used by the DataLoader): one indexing operation for all the samples of the batch
+        return list(zip(self.data[indexes], self.targets[indexes].int().tolist()))
+
     def dataset_download(self):
         paths = [f'{self.root}/syscall/raw/', f'{self.root}/syscall/processed/']
         for path in paths:
@@ -73,43 +90,32 @@ class SYSCALL(Dataset):
 
     def process(self):
         print('Processing SYSCALL dataset...')
-        df = pd.DataFrame()
-        files = os.listdir(f'{self.root}/syscall/raw/')
+        raw_files = os.listdir(f'{self.root}/syscall/raw/')
         feature_name = 'system calls frequency_1gram-scaled'
-        for f in files:
-            if '.csv' in f:
-                fi_path = f'{self.root}/syscall/raw/{f}'
-                csv_df = pd.read_csv(fi_path, sep='\t')
-                feature = [ast.literal_eval(i) for i in csv_df[feature_name]]
-                csv_df[feature_name] = feature
-                df = pd.concat([df, csv_df])
-        df['maltype'] = df['maltype'].replace(to_replace='normalv2', value='normal')
-        classes_to_targets = {}
-        t = 0
-        for i in set(df['maltype']):
-            classes_to_targets[i] = t
-            t += 1
+        # All the CSVs are concatenated at once (only the needed columns)
+        df = pd.concat(
+            [pd.read_csv(f'{self.root}/syscall/raw/{f}', sep='\t', usecols=[feature_name, 'maltype']) for f in raw_files if '.csv' in f],
+            ignore_index=True,
+        )
+        maltype = df['maltype'].replace(to_replace='normalv2', value='normal')
+        # Targets are the codes of the classes (sorted by name)
+        categories = pd.Categorical(maltype)
+        classes_to_targets = {c: t for t, c in enumerate(categories.categories)}
         classes = list(classes_to_targets.keys())
 
-        for c in classes_to_targets:
-            df['maltype'] = df['maltype'].replace(to_replace=c, value=classes_to_targets[c])
-
-        all_targes = torch.tensor(df['maltype'].tolist())
-        all_data = torch.tensor(df[feature_name].tolist())
+        all_targes = torch.from_numpy(categories.codes.astype(np.int64))
+        # Features are stored as text lists ("[f1, f2, ...]"), parsed by numpy instead of evaluating each one as Python code
+        all_data = torch.from_numpy(np.vstack([np.fromstring(f.strip()[1:-1], sep=',', dtype=np.float32) for f in df[feature_name].values]))
 
         x_train, x_test, y_train, y_test = train_test_split(all_data, all_targes, test_size=0.15, random_state=42)
         train = [x_train, y_train, classes_to_targets, classes]
         test = [x_test, y_test, classes_to_targets, classes]
 
-        # save to files
-        train_file = f'{self.root}/syscall/processed/syscall_train.pt'
-        test_file = f'{self.root}/syscall/processed/syscall_test.pt'
-
-        # save to processed dir
-        if not os.path.exists(train_file):
-            torch.save(train, train_file)
-        if not os.path.exists(test_file):
-            torch.save(test, test_file)
+        # save to processed dir (data and targets arrays, they can be memory-mapped)
+        for files, split in ((self.training_files, train), (self.test_files, test)):
+            for f, tensor in zip(files, split[:2]):
+                if not os.path.exists(f):
+                    np.save(f, tensor.numpy())
 
 
 #######################################
@@ -160,23 +166,12 @@ class SYSCALLDataModule(LightningDataModule):
             raise ValueError("Too many partitions")
 
         # Training / validation set
-        trainset = self.train
-        rows_by_sub = floor(len(trainset.data) / self.number_sub)
-        tr_subset = Subset(
-            trainset, range(self.sub_id * rows_by_sub, (self.sub_id + 1) * rows_by_sub)
-        )
-        syscall_train, syscall_val = random_split(
-            tr_subset,
-            [
-                round(len(tr_subset) * (1 - self.val_percent)),
-                round(len(tr_subset) * self.val_percent),
-            ],
-        )
+        syscall_train, syscall_val = split_train_val(self.train, self.sub_id, self.number_sub, self.val_percent)
 
         # Test set
         testset = self.test
         rows_by_sub = floor(len(testset.data) / self.number_sub)
-        te_subset = Subset(
+        te_subset = BatchSubset(
             testset, range(self.sub_id * rows_by_sub, (self.sub_id + 1) * rows_by_sub)
         )
 
@@ -185,19 +180,19 @@ class SYSCALLDataModule(LightningDataModule):
             syscall_train,
             batch_size=self.batch_size,
             shuffle=True,
-            num_workers=self.num_workers,
+            **loader_kwargs(self.num_workers),
         )
         self.val_loader = DataLoader(
             syscall_val,
             batch_size=self.batch_size,
             shuffle=False,
-            num_workers=self.num_workers,
+            **loader_kwargs(self.num_workers),
         )
         self.test_loader = DataLoader(
             te_subset,
             batch_size=self.batch_size,
             shuffle=False,
-            num_workers=self.num_workers,
+            **loader_kwargs(self.num_workers),
         )
         print(
             "Train: {} Val:{} Test:{}".format(
@@ -9,11 +9,14 @@ from math import floor
 # To Avoid Crashes with a lot of nodes
 import torch.multiprocessing
 from lightning import LightningDataModule
-from torch.utils.data import DataLoader, Subset, random_split
+from torch.utils.data import DataLoader
 from torchvision import transforms
 from torchvision.datasets import MNIST, utils
 import urllib.request
 import numpy as np
+
+from fedstellar.learning.pytorch.datautils import BatchSubset, loader_kwargs, split_train_val
+
 torch.multiprocessing.set_sharing_strategy("file_system")
 
 
@@ -41,10 +44,18 @@ class WADI(MNIST):
             self.data = self.data.to(torch.float32)
             self.targets = self.targets.to(torch.float32)
 
+        # Tensors moved to shared memory once, so the DataLoader workers (also when they are spawned) use the same buffers instead of receiving a copy each
+        self.data = self.data.contiguous().share_memory_()
+        self.targets = self.targets.contiguous().share_memory_()
+
     def __getitem__(self, index):
         img, target = self.data[index], int(self.targets[index])
         return img, target
 
+    def __getitems__(self, indexes):
+        # Batch fetch (used by the DataLoader): one indexing operation for all the samples of the batch
+        return list(zip(self.data[indexes], self.targets[indexes].int().tolist()))
+
     def dataset_download(self):
         paths = [f'{self.root}/WADI/']
         for path in paths:
@@ -105,23 +116,12 @@ class WADIDataModule(LightningDataModule):
             raise ("Too much partitions")
 
         # Training / validation set
-        trainset = self.train
-        rows_by_sub = floor(len(trainset) / self.number_sub)
-        tr_subset = Subset(
-            trainset, range(self.sub_id * rows_by_sub, (self.sub_id + 1) * rows_by_sub)
-        )
-        wadi_train, wadi_val = random_split(
-            tr_subset,
-            [
-                round(len(tr_subset) * (1 - self.val_percent)),
-                round(len(tr_subset) * self.val_percent),
-            ],
-        )
+        wadi_train, wadi_val = split_train_val(self.train, self.sub_id, self.number_sub, self.val_percent)
 
         # Test set
         testset = self.test
         rows_by_sub = floor(len(testset) / self.number_sub)
-        te_subset = Subset(
+        te_subset = BatchSubset(
             testset, range(self.sub_id * rows_by_sub, (self.sub_id + 1) * rows_by_sub)
         )
 
@@ -130,19 +130,19 @@ class WADIDataModule(LightningDataModule):
             wadi_train,
             batch_size=self.batch_size,
             shuffle=True,
-            num_workers=self.num_workers,
+            **loader_kwargs(self.num_workers),
         )
         self.val_loader = DataLoader(
             wadi_val,
             batch_size=self.batch_size,
             shuffle=False,
-            num_workers=self.num_workers,
+            **loader_kwargs(self.num_workers),
         )
         self.test_loader = DataLoader(
             te_subset,
             batch_size=self.batch_size,
             shuffle=False,
-            num_workers=self.num_workers,
+            **loader_kwargs(self.num_workers),
         )
         print(
             "Train: {} Val:{} Test:{}".format(
@@ -16,24 +16,36 @@
 #
 
 
+import collections
 import logging
+import select
+import selectors
 import socket
 import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from fedstellar.command import *
 from fedstellar.communication_protocol import CommunicationProtocol
 from fedstellar.config.config import Config
 from fedstellar.utils.observer import Events, Observable
 
+# Maximum number of received buffers processed together (per readable event of the socket)
+RECV_BATCH = 64
+
+# Number of threads that process the received messages (the messages of a connection are always processed in order, by one thread at a time)
+PROCESS_WORKERS = 8
+
 
 ########################
 #    NodeConnection    #
 ########################
 
 
-class NodeConnection(threading.Thread, Observable):
+class NodeConnection(Observable):
     """
-    This class represents a connection to a node. It is a thread, so it's going to process all messages in a background thread using the CommunicationProtocol.
+    This class represents a connection to a node. Its messages are received by the ``ConnectionReactor`` of the node (one thread for all the connections)
+    and processed using the CommunicationProtocol by the workers of the reactor, so a slow command (or a blocking send) never delays the reception of the other connections.
 
     The NodeConnection can receive many messages in a single recv and exists 2 kinds of messages:
         - Binary messages (models)
@@ -45,6 +57,7 @@ class NodeConnection(threading.Thread, Observable):
         parent_node: The parent node of this connection.
         s: The socket of the connection.
         addr: The address of the node that is connected to.
+        reactor: The ``ConnectionReactor`` that receives the messages of the connection.
     """
 
     ##############
@@ -52,25 +65,28 @@ class NodeConnection(threading.Thread, Observable):
     ##############
 
     def __init__(
-            self, parent_node_name, s, addr, aes_cipher, tcp_buffer_size=(None, None), config: Config = None
+            self, parent_node_name, s, addr, aes_cipher, tcp_buffer_size=(None, None), config: Config = None, reactor=None
     ):
         # Init supers
-        threading.Thread.__init__(
-            self,
-            name=(
-                    "node_connection-"
-                    + parent_node_name
-                    + "-"
-                    + str(addr[0])
-                    + ":"
-                    + str(addr[1])
-            ),
-        )
         Observable.__init__(self)
+        self.name = "node_connection-" + parent_node_name + "-" + str(addr[0]) + ":" + str(addr[1])
         # Connection Loop
         self.__terminate_flag = threading.Event()
         self.__socket = s
         self.__socket_lock = threading.Lock()
+        self.__reactor = reactor
+
+        # Receiving state (kept between reactor events)
+        self.__block_size = None
+        self.__node_timeout = None
+        self.__last_recv = None
+        self.__amount_pending_params = 0
+        self.__pending_param_buffer = b""
+        self.__poller = None  # readiness of the socket without blocking (batch reception)
+        # Received messages waiting to be processed (out of the reactor thread)
+        self.__inbox = collections.deque()
+        self.__inbox_lock = threading.Lock()
+        self.__processing = False
 
         if tcp_buffer_size[0] is not None:
             self.__socket.setsockopt(
@@ -86,7 +102,8 @@ class NodeConnection(threading.Thread, Observable):
 
         # Atributes
         self.__addr = addr
-        self.__param_bufffer = b""
+        self._name = addr[0] + ":" + str(addr[1])  # cached, the address never changes
+        self.__param_bufffer = bytearray()
         self.__model_ready = -1
         self.__aes_cipher = aes_cipher
         self.__model_initialized = False
@@ -127,7 +144,7 @@ class NodeConnection(threading.Thread, Observable):
         Returns:
             The name of the node connected to.
         """
-        return self.__addr[0] + ":" + str(self.__addr[1])
+        return self._name
 
     ###################
     #    Main Loop    #
@@ -135,107 +152,175 @@ class NodeConnection(threading.Thread, Observable):
 
     def start(self, force=False):
         """
-        Start the connection. It will start the connection thread, this thread is receiving messages and processing them.
+        Start the connection. The connection is registered in the ``ConnectionReactor`` of the node, which receives its messages and processes them.
 
         Args:
             force: Determine if connection is going to keep alive even if it should not.
         """
+        self.__socket.settimeout(self.config.participant["NODE_TIMEOUT"])
+        self.__block_size = self.config.participant["BLOCK_SIZE"]
+        self.__node_timeout = self.config.participant["NODE_TIMEOUT"]
+        self.__last_recv = time.monotonic()
+        if hasattr(select, "poll"):
+            self.__poller = select.poll()
+            self.__poller.register(self.__socket, select.POLLIN)
         self.notify(Events.NODE_CONNECTED_EVENT, (self, force))
-        return super().start()
+        self.__reactor.add_connection(self)
 
-    def run(self):
-        """
-        NodeConnection loop. Receive and process messages.
+    def fileno(self):
         """
-        self.__socket.settimeout(self.config.participant["NODE_TIMEOUT"])
-        amount_pending_params = 0
-        param_buffer = b""
-        while not self.__terminate_flag.is_set():
+        Returns:
+            The file descriptor of the socket (used by the reactor to wait for messages).
+        """
+        return self.__socket.fileno()
+
+    def on_readable(self):
+        """
+        Receive the messages available in the socket. Called by the reactor when the socket is readable.
+        The buffers that are already available (up to ``RECV_BATCH``) are received first and then queued to be processed as a single batch by a worker of the reactor.
+        """
+        if self.__terminate_flag.is_set():
+            return
+        msgs = []
+        try:
+            while True:
+                msgs.extend(self.__receive())
+                if self.__terminate_flag.is_set() or len(msgs) >= RECV_BATCH:
+                    break
+                # Only receive another buffer if it is already there (otherwise the reactor waits for it)
+                if not self.__data_available():
+                    break
+
+        except socket.timeout:
+            logging.info(
+                "[NODE_CONNECTION] (NodeConnection Loop) Timeout"
+            )
+            self.__terminate_flag.set()
+
+        except Exception as e:
+            logging.info(
+                "[NODE_CONNECTION] (NodeConnection Loop) Exception: {}".format(str(e))
+            )
+            self.__terminate_flag.set()
+
+        if msgs:
+            with self.__inbox_lock:
+                self.__inbox.append(msgs)
+                if self.__processing:
+                    return  # The worker that is processing the connection takes them
+                self.__processing = True
+            self.__reactor.submit(self.__process_inbox)
+
+    def __process_inbox(self):
+        # Processes the queued batches in order (only one worker per connection at a time)
+        while True:
+            with self.__inbox_lock:
+                if not self.__inbox or self.__terminate_flag.is_set():
+                    self.__inbox.clear()
+                    self.__processing = False
+                    return
+                msgs = self.__inbox.popleft()
             try:
-                # Receive message
-                og_msg = b""
-                if amount_pending_params == 0:
-                    og_msg = self.__socket.recv(self.config.participant["BLOCK_SIZE"])
+                self.__process(msgs)
+            except Exception as e:
+                logging.info(
+                    "[NODE_CONNECTION] (NodeConnection Processing) Exception: {}".format(str(e))
+                )
+                self.__terminate_flag.set()
 
-                else:
-                    pending_fragment = self.__socket.recv(amount_pending_params)
-                    og_msg = param_buffer + pending_fragment  # alinear el colapso
-                    param_buffer = b""
-                    amount_pending_params = 0
-
-                # Decrypt message
-                if self.__aes_cipher is not None:
-                    # Guarantee block size (if TCP sctream is slow)
-                    bytes_to_block_size = len(og_msg) % self.__aes_cipher.bs
-                    # Decrypt
-                    if bytes_to_block_size != 0:
-                        msg = self.__aes_cipher.decrypt(
-                            og_msg + self.__socket.recv(bytes_to_block_size)
+    def __process(self, msgs):
+        # Process messages
+        exec_msgs, error = self.comm_protocol.process_messages(msgs)
+        if len(exec_msgs) > 0:
+            self.notify(
+                Events.PROCESSED_MESSAGES_EVENT, (self, exec_msgs)
+            )  # Notify the parent node
+
+        # Error happened
+        if error:
+            self.__terminate_flag.set()
+            logging.info(
+                "[NODE_CONNECTION] An error happened. Last error: {}".format(msgs)
+            )
+
+    def __data_available(self):
+        # poll() has no limit on the file descriptor number (select() does)
+        if self.__poller is not None:
+            return bool(self.__poller.poll(0))
+        return bool(select.select([self.__socket], [], [], 0)[0])
+
+    def __receive(self):
+        """
+        Receive a buffer from the socket (decrypted) and split it into messages: each ``PARAMS`` block (framed by its length) is a message and so is the text between them.
+
+        Returns:
+            List of messages to process, empty if there is nothing to process yet (connection closed or incomplete ``PARAMS`` block).
+        """
+        # Receive message (the rest of the pending params block or a new buffer)
+        og_msg = self.__socket.recv(self.__amount_pending_params or self.__block_size)
+        if og_msg == b"":
+            # Connection closed by the other node
+            self.__terminate_flag.set()
+            return []
+        self.__last_recv = time.monotonic()
+
+        # Decrypt message (stream cipher, any amount of bytes can be decrypted)
+        if self.__aes_cipher is not None:
+            msg = self.__aes_cipher.decrypt(og_msg)
+        else:
+            msg = og_msg
+
+        # Data of a pending params block goes first (decrypted, so it can be cut at any byte)
+        if self.__pending_param_buffer:
+            msg = self.__pending_param_buffer + msg
+            self.__pending_param_buffer = b""
+        self.__amount_pending_params = 0
+
+        msgs = []
+        while msg:
+            if msg.startswith(CommunicationProtocol.PARAMS_B):
+                # Check if all bytes of the params block are received
+                missing = CommunicationProtocol.check_params_incomplete(msg)
+                if missing != 0:
+                    self.__pending_param_buffer = msg
+                    self.__amount_pending_params = missing
+                    break
+                end = CommunicationProtocol.get_params_msg_len(msg)
+            else:
+                # Check if there is a collapse (text message followed by a params block)
+                end = CommunicationProtocol.check_collapse(msg)
+                if end > 0:
+                    logging.debug(
+                        "[NODE_CONNECTION] Collapse detected: {}".format(
+                            msg[:end]
                         )
-                    else:
-                        msg = self.__aes_cipher.decrypt(og_msg)
+                    )
                 else:
-                    msg = og_msg
-
-                # Process messages
-                if msg != b"":
-                    # Check if fragments are incomplete (collapse / TCP stream slow)
-                    overflow = CommunicationProtocol.check_collapse(msg)
-                    if overflow > 0:
-                        param_buffer = og_msg[overflow:]
-                        amount_pending_params = self.config.participant["BLOCK_SIZE"] - len(param_buffer)
-                        msg = msg[:overflow]
-                        logging.debug(
-                            "[NODE_CONNECTION] Collapse detected: {}".format(
-                                msg
-                            )
-                        )
+                    end = len(msg)
+            msgs.append(msg[:end])
+            msg = msg[end:]
 
-                    else:
-                        # Check if all bytes of param_buffer are received
-                        amount_pending_params = (
-                            CommunicationProtocol.check_params_incomplete(msg, self.config.participant["BLOCK_SIZE"])
-                        )
-                        if amount_pending_params != 0:
-                            param_buffer = msg
-                            continue
-
-                    # Process message
-                    # if len(str(msg)) > 300:
-                    #     logging.info(
-                    #        "[NODE_CONNECTION] Processing message: Too long [...]"
-                    #    )
-                    # else:
-                    #    logging.info(
-                    #        "[NODE_CONNECTION] Processing message: {}".format(msg)
-                    #    )
-                    exec_msgs, error = self.comm_protocol.process_message(msg)
-                    if len(exec_msgs) > 0:
-                        self.notify(
-                            Events.PROCESSED_MESSAGES_EVENT, (self, exec_msgs)
-                        )  # Notify the parent node
-
-                    # Error happened
-                    if error:
-                        self.__terminate_flag.set()
-                        logging.info(
-                            "[NODE_CONNECTION] An error happened. Last error: {}".format(msg)
-                        )
+        return msgs
 
-            except socket.timeout:
-                logging.info(
-                    "[NODE_CONNECTION] (NodeConnection Loop) Timeout"
-                )
-                self.__terminate_flag.set()
-                break
+    def is_finished(self, now):
+        """
+        Check if the connection has to be closed (stopped, error or no messages received in ``NODE_TIMEOUT`` seconds).
+        Before closing a connection by timeout, its socket is checked again: data waiting to be read means the connection is alive.
 
-            except Exception as e:
-                logging.info(
-                    "[NODE_CONNECTION] (NodeConnection Loop) Exception: {}".format(str(e))
-                )
-                self.__terminate_flag.set()
-                break
+        Args:
+            now: Current value of ``time.monotonic()``.
+        """
+        if not self.__terminate_flag.is_set() and now - self.__last_recv > self.__node_timeout and not self.__data_available():
+            logging.info(
+                "[NODE_CONNECTION] (NodeConnection Loop) Timeout"
+            )
+            self.__terminate_flag.set()
+        return self.__terminate_flag.is_set()
 
+    def close(self):
+        """
+        Close the socket and notify the parent node. Called by the reactor once the connection is finished.
+        """
         # Down Connection
         logging.info("[NODE_CONNECTION] Closed connection: {}".format(self.get_name()))
         self.notify(Events.END_CONNECTION_EVENT, self)
@@ -343,9 +428,11 @@ class NodeConnection(threading.Thread, Observable):
         Add a segment of parameters to the buffer.
 
         Args:
-            data: The segment of parameters.
+            data: The segment of parameters (bytes-like object, it can be a view over the received block).
+
+        The segment is copied here (the buffer is the one that retains the data), it is extended in place so each byte is copied only once.
         """
-        self.__param_bufffer = self.__param_bufffer + data
+        self.__param_bufffer += data
 
     def get_params(self):
         """
@@ -356,9 +443,9 @@ class NodeConnection(threading.Thread, Observable):
 
     def clear_buffer(self):
         """
-        Clear the params buffer.
+        Clear the params buffer (a new buffer is used, the previous content is still owned by who got it with ``get_params``).
         """
-        self.__param_bufffer = b""
+        self.__param_bufffer = bytearray()
 
     ##################
     #    Messages    #
@@ -378,16 +465,41 @@ class NodeConnection(threading.Thread, Observable):
         # Check if the connection is still alive
         if not self.__terminate_flag.is_set():
             try:
-                # Encrypt message
-                if self.__aes_cipher is not None:
-                    data = self.__aes_cipher.add_padding(
-                        data
-                    )  # -> It cant broke the model because it fills all the block space
-                    data = self.__aes_cipher.encrypt(data)
-                # Send message
-                self.__socket_lock.acquire()
-                self.__socket.sendall(data)
-                self.__socket_lock.release()
+                with self.__socket_lock:
+                    # Encrypt message (in the lock: the keystream has to be consumed in the same order messages are sent)
+                    if self.__aes_cipher is not None:
+                        data = self.__aes_cipher.encrypt(data)
+                    # Send message
+                    self.__socket.sendall(data)
+                return True
+
+            except Exception as e:
+                # If some error happened, the connection is closed
+                self.__terminate_flag.set()
+                return False
+        else:
+            return False
+
+    def send_mv(self, data):
+        """
+        Same as ``send``, but for a ``memoryview`` shared by several connections (broadcast).
+        Without encryption, the buffer is written with ``sendmsg`` (scatter/gather), so it is not copied for each neighbor.
+
+        Args:
+            data: (memoryview) The message to send.
+
+        Returns:
+            True if the message was sent, False otherwise.
+        """
+        if self.__aes_cipher is not None or not hasattr(self.__socket, "sendmsg"):
+            # Encryption is made with the key of each connection
+            return self.send(bytes(data))
+
+        if not self.__terminate_flag.is_set():
+            try:
+                with self.__socket_lock:
+                    while data:
+                        data = data[self.__socket.sendmsg([data]):]
                 return True
 
             except Exception as e:
@@ -465,3 +577,111 @@ class NodeConnection(threading.Thread, Observable):
         logging.info("[NODE_CONNECTION] Previous role: {}".format(self.config.participant['device_args']['role']))
         self.config.participant['device_args']['role'] = value
         logging.info("[NODE_CONNECTION] New role: {}".format(self.config.participant['device_args']['role']))
+
+
+###########################
+#    ConnectionReactor    #
+###########################
+
+
+class ConnectionReactor(threading.Thread):
+    """
+    Thread that receives the messages of all the connections of a node (one ``selectors`` loop instead of one thread per connection).
+
+    Connections are added from any thread, but they are only registered, read and closed by the reactor thread.
+    The received messages are processed by a pool of ``PROCESS_WORKERS`` threads, so the reactor only receives (and the connections don't time out while a command runs).
+    Finished connections (stopped, error or ``NODE_TIMEOUT`` without messages) are closed, at least, once per second.
+
+    Args:
+        node_name (str): Name of the parent node.
+    """
+
+    def __init__(self, node_name):
+        threading.Thread.__init__(self, name="reactor-" + node_name)
+        self.__terminate_flag = threading.Event()
+        self.__selector = selectors.DefaultSelector()
+        self.__connections = set()
+        self.__new_connections = []
+        self.__new_connections_lock = threading.Lock()
+        # Socket pair used to wake up the select when a connection is added or the reactor is stopped
+        self.__wakeup_r, self.__wakeup_w = socket.socketpair()
+        self.__wakeup_r.setblocking(False)
+        self.__selector.register(self.__wakeup_r, selectors.EVENT_READ, None)
+        self.__executor = ThreadPoolExecutor(max_workers=PROCESS_WORKERS, thread_name_prefix="process-" + node_name)
+
+    def submit(self, fn):
+        """
+        Run a function in a worker of the reactor (used by the connections to process their messages).
+
+        Args:
+            fn: The function (without arguments).
+        """
+        try:
+            self.__executor.submit(fn)
+        except RuntimeError:
+            # The reactor is stopped
+            pass
+
+    def add_connection(self, nc):
+        """
+        Add a connection to the reactor.
+
+        Args:
+            nc (NodeConnection): The connection.
+        """
+        with self.__new_connections_lock:
+            self.__new_connections.append(nc)
+        self.__wakeup()
+
+    def __wakeup(self):
+        try:
+            self.__wakeup_w.send(b"\0")
+        except OSError:
+            pass
+
+    def __close_connection(self, nc):
+        self.__selector.unregister(nc)
+        self.__connections.discard(nc)
+        nc.close()
+
+    def run(self):
+        """
+        Reactor loop. Waits for readable connections and lets them process their messages.
+        """
+        while not self.__terminate_flag.is_set():
+            # Register the new connections
+            with self.__new_connections_lock:
+                new_connections, self.__new_connections = self.__new_connections, []
+            for nc in new_connections:
+                self.__selector.register(nc, selectors.EVENT_READ, nc)
+                self.__connections.add(nc)
+
+            for key, _ in self.__selector.select(timeout=1):
+                nc = key.data
+                if nc is None:
+                    try:
+                        self.__wakeup_r.recv(4096)
+                    except BlockingIOError:
+                        pass
+                    continue
+                nc.on_readable()
+
+            # Close finished connections
+            now = time.monotonic()
+            for nc in list(self.__connections):
+                if nc.is_finished(now):
+                    self.__close_connection(nc)
+
+        for nc in list(self.__connections):
+            self.__close_connection(nc)
+        self.__executor.shutdown(wait=False)
+        self.__selector.close()
+        self.__wakeup_r.close()
+        self.__wakeup_w.close()
+
+    def stop(self):
+        """
+        Stop the reactor. The remaining connections are closed.
+        """
+        self.__terminate_flag.set()
+        self.__wakeup()
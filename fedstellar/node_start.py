@@ -1,5 +1,6 @@
 import logging
 import os
+import signal
 import sys
 import time
 
@@ -43,10 +44,15 @@ def main():
 
     aggregation_algorithm = config.participant["aggregator_args"]["algorithm"]
 
+    # DataLoader workers of the node (FEDSTELLAR_NUM_WORKERS overrides the default). Windows spawns workers instead of forking them, so only one is used there
+    num_workers = int(os.environ.get("FEDSTELLAR_NUM_WORKERS", 4))
+    if os.name == "nt":
+        num_workers = min(num_workers, 1)
+
     dataset = config.participant["data_args"]["dataset"]
     model = None
     if dataset == "MNIST":
-        dataset = MNISTDataModule(sub_id=idx, number_sub=n_nodes, iid=True)
+        dataset = MNISTDataModule(sub_id=idx, number_sub=n_nodes, num_workers=num_workers, iid=True)
         if model_name == "MLP":
             model = MNISTModelMLP()
         elif model_name == "CNN":
@@ -54,13 +60,13 @@ def main():
         else:
             raise ValueError(f"Model {model} not supported")
     elif dataset == "FEMNIST":
-        dataset = FEMNISTDataModule(sub_id=idx, number_sub=n_nodes, root_dir=f"{sys.path[0]}/data")
+        dataset = FEMNISTDataModule(sub_id=idx, number_sub=n_nodes, num_workers=num_workers, root_dir=f"{sys.path[0]}/data")
         if model_name == "CNN":
             model = FEMNISTModelCNN()
         else:
             raise ValueError(f"Model {model} not supported")
     elif dataset == "SYSCALL":
-        dataset = SYSCALLDataModule(sub_id=idx, number_sub=n_nodes, root_dir=f"{sys.path[0]}/data")
+        dataset = SYSCALLDataModule(sub_id=idx, number_sub=n_nodes, num_workers=num_workers, root_dir=f"{sys.path[0]}/data")
         if model_name == "MLP":
             model = SyscallModelMLP()
         elif model_name == "SVM":
@@ -70,7 +76,7 @@ def main():
         else:
             raise ValueError(f"Model {model} not supported")
     elif dataset == "CIFAR10":
-        dataset = CIFAR10DataModule(sub_id=idx, number_sub=n_nodes, root_dir=f"{sys.path[0]}/data")
+        dataset = CIFAR10DataModule(sub_id=idx, number_sub=n_nodes, num_workers=num_workers, root_dir=f"{sys.path[0]}/data")
         if model_name == "ResNet9":
             model = CIFAR10ModelResNet(classifier="resnet9")
         elif model_name == "ResNet18":
@@ -101,6 +107,13 @@ def main():
         encrypt=False
     )
 
+    # The controller stops the nodes with SIGTERM: the pending logs are written before exiting
+    def sigterm_handler(sig, frame):
+        node.flush_logs()
+        os._exit(0)
+
+    signal.signal(signal.SIGTERM, sigterm_handler)
+
     node.start()
     print("Node started, grace time for network start-up (30s)")
     time.sleep(30)  # Wait for the participant to start and register in the network
@@ -70,7 +70,7 @@ class Events:
     """
     GOSSIP_BROADCAST_EVENT = "GOSSIP_BROADCAST_EVENT"
     """
-    Used to notify when a node must send gossiped messages. (arg: (msg,nodes))
+    Used to notify when a node must send gossiped messages. (arg: [(msg, excluded nodes), ...])
     """
     BEAT_RECEIVED_EVENT = "BEAT_RECEIVED_EVENT"
     """
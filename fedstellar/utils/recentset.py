@@ -0,0 +1,50 @@
+#
+# This file is part of the fedstellar framework (see https://github.com/enriquetomasmb/fedstellar).
+# Copyright (c) 2022 Enrique Tomás Martínez Beltrán.
+#
+
+
+"""
+Module that implements a bounded set used to remember the messages already processed.
+"""
+import threading
+
+
+class RecentSet:
+    """
+    Exact set of the last keys added (no false positives: a new message is never taken as already processed, so it is always executed).
+
+    Keys can't be removed one by one, so the set works with two generations: when the current one holds ``capacity`` keys it becomes the previous one and a new empty generation starts.
+    Thus, at least the last ``capacity`` keys (and at most ``2 * capacity``) are remembered.
+
+    Args:
+        capacity: Number of keys per generation.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = max(1, capacity)
+        self.__current = set()
+        self.__previous = set()
+        self.__lock = threading.Lock()  # the keys are added by the workers of several connections
+
+    def add(self, key):
+        """
+        Add a key to the set (if it is not already in it).
+
+        Args:
+            key: Hashable key.
+
+        Returns:
+            True if the key was added, False if it was already in the set.
+        """
+        with self.__lock:
+            if key in self.__current or key in self.__previous:
+                return False
+            if len(self.__current) >= self.capacity:
+                self.__previous = self.__current
+                self.__current = set()
+            self.__current.add(key)
+            return True
+
+    def __contains__(self, key):
+        return key in self.__current or key in self.__previous
@@ -13,6 +13,7 @@ sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '
 
 from ansi2html import Ansi2HTMLConverter
 
+from fedstellar.config.config import _save_json_file
 from fedstellar.controller import Controller
 
 from flask import Flask, session, url_for, redirect, render_template, request, abort, flash, send_file, make_response, jsonify, Response
@@ -669,8 +670,7 @@ def fedstellar_scenario_deployment_run():
                 participant_config["training_args"]["epochs"] = int(data["epochs"])
                 participant_config["device_args"]["accelerator"] = data["accelerator"]  # same for all nodes
 
-                with open(participant_file, 'w') as f:
-                    json.dump(participant_config, f, sort_keys=False, indent=2)
+                _save_json_file(participant_file, participant_config)
 
             # Create a argparse object
             import argparse
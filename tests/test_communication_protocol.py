@@ -0,0 +1,80 @@
+#
+# This file is part of the fedstellar framework (see https://github.com/enriquetomasmb/fedstellar).
+# Copyright (c) 2022 Enrique Tomás Martínez Beltrán.
+#
+import unittest
+
+from fedstellar.communication_protocol import CommunicationProtocol
+
+
+class _Config:
+    participant = {"AMOUNT_LAST_MESSAGES_SAVED": 100}
+
+
+class _Recorder:
+    def __init__(self, log, name):
+        self.log = log
+        self.name = name
+
+    def execute(self, *args):
+        self.log.append((self.name, args))
+
+
+def _protocol():
+    log = []
+    actions = (
+        CommunicationProtocol.BEAT,
+        CommunicationProtocol.ROLE,
+        CommunicationProtocol.CONN_TO,
+        CommunicationProtocol.METRICS,
+        CommunicationProtocol.VOTE_TRAIN_SET,
+        CommunicationProtocol.MODELS_AGGREGATED,
+    )
+    return CommunicationProtocol({a: _Recorder(log, a) for a in actions}, _Config()), log
+
+
+class TestWhitespaceSeparators(unittest.TestCase):
+    """
+    Tokens of the text messages can be separated by any run of whitespace (as with ``split()``).
+    """
+
+    def test_beat_with_several_spaces(self):
+        protocol, log = _protocol()
+        exec_msgs, error = protocol.process_message(b"BEAT  a:1 b\n")
+        self.assertFalse(error)
+        self.assertEqual(log, [(CommunicationProtocol.BEAT, ("a:1",))])
+        # The gossiped text is normalized
+        self.assertEqual(exec_msgs, {b"b": b"BEAT a:1 b\n"})
+
+    def test_tabs_and_trailing_spaces(self):
+        protocol, log = _protocol()
+        exec_msgs, error = protocol.process_message(b"ROLE\ta:1  aggregator 55 \nCONNECT_TO  1.2.3.4   5000\n")
+        self.assertFalse(error)
+        self.assertEqual(
+            log,
+            [(CommunicationProtocol.ROLE, ("a:1", "aggregator")), (CommunicationProtocol.CONN_TO, ("1.2.3.4", 5000))],
+        )
+        self.assertEqual(exec_msgs, {b"55": b"ROLE a:1 aggregator 55\n"})
+
+    def test_counted_lists(self):
+        protocol, log = _protocol()
+        _, error = protocol.process_message(b"VOTE_TRAIN_SET n:1 2  a:1 1   b:1 2 77\nMODELS_AGGREGATED  2 a:1  b:1\n")
+        self.assertFalse(error)
+        self.assertEqual(
+            log,
+            [
+                (CommunicationProtocol.VOTE_TRAIN_SET, ("n:1", {"a:1": 1, "b:1": 2})),
+                (CommunicationProtocol.MODELS_AGGREGATED, (["a:1", "b:1"],)),
+            ],
+        )
+
+    def test_single_spaces_unchanged(self):
+        protocol, log = _protocol()
+        exec_msgs, error = protocol.process_message(b"METRICS n:1 3 0.5 0.25 88\n")
+        self.assertFalse(error)
+        self.assertEqual(log, [(CommunicationProtocol.METRICS, ("n:1", 3, 0.5, 0.25))])
+        self.assertEqual(exec_msgs, {b"88": b"METRICS n:1 3 0.5 0.25 88\n"})
+
+
+if __name__ == "__main__":
+    unittest.main()